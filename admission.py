@@ -0,0 +1,147 @@
+"""
+admission.py – how busy a worker is, and what LiveKit should be told
+Load is the most saturated of four signals, each scaled so 1.0 = full:
+• CPU (cgroup-aware monitor from livekit.agents)
+• active sessions / AGENT_MAX_SESSIONS
+• event-loop lag of the job processes / AGENT_MAX_LOOP_LAG_MS
+• in-flight LLM requests / AGENT_MAX_INFLIGHT
+`load_fnc` goes into WorkerOptions: once it crosses AGENT_LOAD_THRESHOLD the
+worker stops advertising availability. A caller dispatched just before that
+hears a cached "please hold" and waits for capacity instead of joining a
+session that is already slow.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from livekit.agents.utils.hw import get_cpu_monitor
+
+import worker_status
+
+logger = logging.getLogger("admission")
+
+THRESHOLD = float(os.getenv("AGENT_LOAD_THRESHOLD", "0.8"))
+MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", "8"))
+MAX_LOOP_LAG = float(os.getenv("AGENT_MAX_LOOP_LAG_MS", "200")) / 1000
+MAX_INFLIGHT = int(os.getenv("AGENT_MAX_INFLIGHT", "16"))
+HOLD_MAX = float(os.getenv("AGENT_HOLD_MAX_S", "30"))
+LAG_INTERVAL = 0.5
+STALE_AFTER = 5.0  # ignore job-process snapshots older than this (process gone)
+
+# Process-wide counters: holds, hold_timeouts
+COUNTERS: Counter = Counter()
+
+_inflight = 0
+
+
+# ── Job process side ──────────────────────────────────────────────────
+@contextmanager
+def track():
+    """Count one provider request as in flight for the load figure."""
+    global _inflight
+    _inflight += 1
+    try:
+        yield
+    finally:
+        _inflight -= 1
+
+
+_monitor: asyncio.Task | None = None
+
+
+async def _watch_loop() -> None:
+    lag = 0.0
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        # decay slowly so one spike stays visible for a few ticks
+        lag = max(time.perf_counter() - t0 - LAG_INTERVAL, lag * 0.5)
+        worker_status.publish("loop", {"at": time.time(), "lag_s": lag, "inflight": _inflight})
+
+
+def start_monitor() -> None:
+    """Once per job process, from inside its event loop."""
+    global _monitor
+    if _monitor is None or _monitor.done():
+        _monitor = asyncio.get_running_loop().create_task(_watch_loop())
+
+
+def _over_capacity() -> bool:
+    others = max(worker_status.active_sessions(worker_status.WORKER_ID) - 1, 0)
+    parts = [others / MAX_SESSIONS]
+    for s in worker_status.collect("load", worker_status.WORKER_ID):
+        parts += [s.get("cpu", 0.0), s.get("loop_lag", 0.0), s.get("inflight", 0.0)]
+    return max(parts) >= THRESHOLD
+
+
+async def over_capacity() -> bool:
+    """Whether the worker is at or above the threshold without this job's own
+    session: its marker is written before the agent starts, so the published
+    figure already counts the caller being admitted. Sessions are recounted
+    here; the other signals come from the last published load. The status
+    files are read in a thread, off the job's event loop."""
+    return await asyncio.to_thread(_over_capacity)
+
+
+async def wait_for_capacity(timeout: float = HOLD_MAX) -> bool:
+    COUNTERS["holds"] += 1
+    try:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(1.0)
+            if not await over_capacity():
+                return True
+        COUNTERS["hold_timeouts"] += 1
+        logger.warning(f"Still over capacity after {timeout:.0f} s hold; starting the call anyway")
+        return False
+    finally:
+        await asyncio.to_thread(worker_status.publish, "admission", dict(COUNTERS))
+
+
+# ── Worker (main process) side ────────────────────────────────────────
+_cpu = {"value": 0.0}
+_sampler: threading.Thread | None = None
+
+
+def _sample_cpu() -> None:
+    monitor = get_cpu_monitor()
+    while True:
+        _cpu["value"] = monitor.cpu_percent(interval=1.0)
+
+
+def current_load() -> dict:
+    global _sampler
+    if _sampler is None:
+        _sampler = threading.Thread(target=_sample_cpu, name="cpu-sampler", daemon=True)
+        _sampler.start()
+
+    now = time.time()
+    loops = [s for s in worker_status.collect("loop", worker_status.WORKER_ID)
+             if now - s.get("at", 0) < STALE_AFTER]
+    sessions = worker_status.active_sessions(worker_status.WORKER_ID)
+    lag = max((s["lag_s"] for s in loops), default=0.0)
+    inflight = sum(s["inflight"] for s in loops)
+    parts = {
+        "cpu": _cpu["value"],
+        "sessions": sessions / MAX_SESSIONS,
+        "loop_lag": lag / MAX_LOOP_LAG,
+        "inflight": inflight / MAX_INFLIGHT,
+    }
+    return {
+        "load": round(min(max(parts.values()), 1.0), 3),
+        **{k: round(v, 3) for k, v in parts.items()},
+        "active_sessions": sessions,
+        "loop_lag_ms": round(lag * 1000, 1),
+        "inflight_requests": inflight,
+    }
+
+
+def load_fnc(worker=None) -> float:
+    """WorkerOptions.load_fnc; also publishes the breakdown for main.py."""
+    figures = current_load()
+    worker_status.publish("load", figures)
+    return figures["load"]
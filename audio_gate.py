@@ -0,0 +1,89 @@
+"""
+audio_gate.py – send the STT only the audio around speech
+The session's Silero VAD already decides when the caller is speaking
+(user_state_changed). The gate reuses those decisions instead of running a
+second VAD. While the caller is silent, frames are held in a short ring
+buffer instead of being streamed to Deepgram:
+• pre-roll: the last STT_PRE_ROLL_MS of audio is flushed when speech starts,
+  so the onset the VAD needed to decide is not clipped
+• hangover: audio keeps flowing for STT_HANGOVER_MS after speech ends, so
+  the STT sees the trailing silence it uses for endpointing
+Durations are counted on the audio clock (frame lengths), not wall time.
+"""
+import os
+import logging
+from collections import Counter, deque
+from typing import AsyncIterable, AsyncIterator
+
+from livekit import rtc
+
+import worker_status
+
+logger = logging.getLogger("audio-gate")
+
+ENABLED = os.getenv("STT_GATE", "1").lower() in ("1", "true", "yes")
+PRE_ROLL = float(os.getenv("STT_PRE_ROLL_MS", "300")) / 1000
+HANGOVER = float(os.getenv("STT_HANGOVER_MS", "600")) / 1000
+
+# Process-wide totals over finished sessions: sessions, seconds_in, seconds_sent,
+# bytes_in, bytes_sent
+COUNTERS: Counter = Counter()
+
+
+class SpeechGate:
+    def __init__(self, pre_roll: float = PRE_ROLL, hangover: float = HANGOVER) -> None:
+        self.pre_roll = pre_roll
+        self.hangover = hangover
+        self.speaking = False
+        self._ring: deque[tuple[rtc.AudioFrame, float]] = deque()
+        self._ring_s = 0.0
+        self._since_speech = float("inf")  # audio seconds since the caller stopped
+        self.stats: Counter = Counter()
+
+    def set_speaking(self, speaking: bool) -> None:
+        if self.speaking and not speaking:
+            self._since_speech = 0.0
+        self.speaking = speaking
+
+    def _open(self) -> bool:
+        return self.speaking or self._since_speech < self.hangover
+
+    async def filter(self, audio: AsyncIterable[rtc.AudioFrame]) -> AsyncIterator[rtc.AudioFrame]:
+        async for frame in audio:
+            duration = frame.samples_per_channel / frame.sample_rate
+            self.stats["seconds_in"] += duration
+            self.stats["bytes_in"] += frame.data.nbytes
+            if not self.speaking:
+                self._since_speech += duration
+
+            if not self._open():
+                self._ring.append((frame, duration))
+                self._ring_s += duration
+                while self._ring_s - self._ring[0][1] >= self.pre_roll:
+                    self._ring_s -= self._ring.popleft()[1]
+                continue
+
+            while self._ring:  # speech just started: pre-roll first
+                yield self._send(*self._ring.popleft())
+            self._ring_s = 0.0
+            yield self._send(frame, duration)
+
+    def _send(self, frame: rtc.AudioFrame, duration: float) -> rtc.AudioFrame:
+        self.stats["seconds_sent"] += duration
+        self.stats["bytes_sent"] += frame.data.nbytes
+        return frame
+
+    def saved(self) -> dict:
+        s = self.stats
+        return {
+            "seconds_saved": round(s["seconds_in"] - s["seconds_sent"], 2),
+            "bytes_saved": s["bytes_in"] - s["bytes_sent"],
+            "fraction_saved": round(1 - s["seconds_sent"] / s["seconds_in"], 3) if s["seconds_in"] else 0.0,
+        }
+
+    def finish(self) -> dict:
+        """Fold this session into the process totals; returns its savings."""
+        COUNTERS["sessions"] += 1
+        COUNTERS.update(self.stats)
+        worker_status.publish("audio_gate", dict(COUNTERS))
+        return self.saved()
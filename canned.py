@@ -0,0 +1,204 @@
+"""
+canned.py – local answers for the scripted parts of a call
+Built once per worker process from the scripted turns of the paste.txt
+dialogue corpus (greetings, name/phone, thanks). Symptom records (tagged
+[Severity: …]) and any reply that grades severity are left out: a fuzzy
+match must never hand out clinical advice.
+  1. exact lookup on the normalised, slot-templated user text
+  2. character n-gram TF-IDF nearest neighbour (NumPy) above a cosine threshold;
+     not for turns that mention a symptom or are much longer than the match
+Intake answers (asking for name and phone) are only given until the caller
+has provided both, so "Hello?" mid-call does not restart the intake.
+Names and phone numbers are turned into {name}/{phone} slots on both sides,
+so "My name is Ravi Patel and my number is 9123456789" answers
+"Thank you, Ravi Patel. ..." for any caller.
+"""
+import os
+import re
+import json
+import time
+import logging
+from collections import Counter
+
+import numpy as np
+
+import worker_status
+from intent import normalize
+
+logger = logging.getLogger("canned")
+
+CORPUS_PATH = os.getenv(
+    "CANNED_CORPUS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "paste.txt")
+)
+THRESHOLD = float(os.getenv("CANNED_THRESHOLD", "0.85"))
+NGRAM_RANGE = (3, 5)
+
+_NAME_RE = re.compile(
+    r"\b(?:my name is|name is|mera naam)\s+([a-z]+(?:\s+(?!and\b|hai\b)[a-z]+)?)", re.I
+)
+_PHONE_RE = re.compile(r"(?<!\d)(?:\+?91[\s-]?)?(\d[\d\s-]{8,13}\d)(?!\d)")
+_USER_RE = re.compile(r"User:\s*(.*?)\s*(?:\nAssistant:|$)", re.S)
+_CLINICAL_RE = re.compile(r"\b(?:mild|serious|emergency|severity)\b", re.I)
+# A caller describing a symptom; such a turn always goes to the LLM
+SYMPTOM_RE = re.compile(
+    r"\b(pain|ache|aching|hurt|hurts|fever|cough|cold|vomit\w*|nause\w*|dizz\w*|tired|"
+    r"breath\w*|bleed\w*|rash|itch\w*|swell\w*|swollen|anxi\w*|depress\w*|stress\w*|"
+    r"sleep|headache|chest|stomach|diarrh\w*|burn\w*|numb\w*|weak\w*|feel\w*)\b",
+    re.I,
+)
+# Intake turns: asking for, or thanking for, the caller's name and phone
+_INTAKE_RE = re.compile(r"\b(?:name|phone|number|details)\b", re.I)
+MAX_LENGTH_RATIO = 1.5  # a fuzzy hit's query may be at most this much longer than the key
+
+# Process-wide counters: exact, fuzzy, misses, guarded (a hit refused by the checks above)
+COUNTERS: Counter = Counter()
+
+
+def extract_slots(text: str) -> dict:
+    slots = {}
+    m = _NAME_RE.search(text)
+    if m:
+        slots["name"] = m.group(1).strip().title()
+    m = _PHONE_RE.search(text)
+    if m:
+        slots["phone"] = re.sub(r"\D", "", m.group(1))
+    return slots
+
+
+def templatize(text: str, slots: dict) -> str:
+    """Replace slot values in `text` with {name}/{phone} placeholders."""
+    for key, value in slots.items():
+        if key == "phone":
+            text = _PHONE_RE.sub("{phone}", text)
+        else:
+            text = re.sub(re.escape(value), "{%s}" % key, text, flags=re.I)
+    return text
+
+
+def _ngrams(text: str) -> list[str]:
+    padded = f" {text} "
+    lo, hi = NGRAM_RANGE
+    return [padded[i:i + n] for n in range(lo, hi + 1) for i in range(len(padded) - n + 1)]
+
+
+# ── Index ─────────────────────────────────────────────────────────────
+class ResponseIndex:
+    def __init__(self, pairs: list[tuple[str, str]], threshold: float = THRESHOLD) -> None:
+        self.threshold = threshold
+        self.keys: list[str] = []
+        self.responses: list[str] = []
+        self.intake: list[bool] = []
+        self.exact: dict[str, int] = {}
+        for user_text, response in pairs:
+            slots = extract_slots(user_text)
+            key = normalize(templatize(user_text, slots))
+            if not key or key in self.exact:
+                continue
+            self.exact[key] = len(self.keys)
+            self.keys.append(key)
+            self.responses.append(templatize(response, slots))
+            self.intake.append(bool(_INTAKE_RE.search(key) or _INTAKE_RE.search(response)))
+
+        self.vocab: dict[str, int] = {}
+        rows = [Counter(_ngrams(k)) for k in self.keys]
+        for row in rows:
+            for gram in row:
+                self.vocab.setdefault(gram, len(self.vocab))
+        df = np.zeros(len(self.vocab), dtype=np.float32)
+        tf = np.zeros((len(rows), len(self.vocab)), dtype=np.float32)
+        for i, row in enumerate(rows):
+            for gram, count in row.items():
+                j = self.vocab[gram]
+                tf[i, j] = count
+                df[j] += 1
+        self.idf = np.log((1 + len(rows)) / (1 + df)) + 1
+        self.matrix = self._l2(tf * self.idf)
+
+    @staticmethod
+    def _l2(m: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(m, axis=-1, keepdims=True)
+        return m / np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def from_jsonl(cls, path: str = CORPUS_PATH) -> "ResponseIndex":
+        pairs = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                prompt, response = data["prompt"], data["response"].strip()
+                if "[Severity:" in prompt or _CLINICAL_RE.search(response):
+                    continue  # symptom advice is the LLM's (and triage's) job
+                m = _USER_RE.search(prompt)
+                # Reports are per-caller JSON, never a canned answer
+                if m and not response.startswith("{"):
+                    pairs.append((m.group(1), response))
+        return cls(pairs)
+
+    def _vector(self, key: str) -> np.ndarray:
+        vec = np.zeros(len(self.vocab), dtype=np.float32)
+        for gram, count in Counter(_ngrams(key)).items():
+            j = self.vocab.get(gram)
+            if j is not None:
+                vec[j] = count
+        return self._l2(vec * self.idf)
+
+    def lookup(self, text: str, intake_done: bool = False) -> tuple[str | None, float]:
+        """Best local answer with its confidence, or (None, score) below threshold
+        or when the hit is refused (see the module docstring)."""
+        slots = extract_slots(text)
+        key = normalize(templatize(text, slots))
+        if not key or not self.keys:
+            return None, 0.0
+
+        i = self.exact.get(key)
+        score = 1.0
+        if i is None:
+            scores = self.matrix @ self._vector(key)
+            i = int(scores.argmax())
+            score = float(scores[i])
+            if score < self.threshold:
+                return None, score
+            if SYMPTOM_RE.search(text) or len(key) > MAX_LENGTH_RATIO * len(self.keys[i]):
+                COUNTERS["guarded"] += 1
+                return None, score
+        if intake_done and self.intake[i]:
+            COUNTERS["guarded"] += 1
+            return None, score
+
+        response = self.responses[i]
+        try:
+            return response.format_map(slots), score
+        except (KeyError, ValueError):
+            return None, score  # template needs a slot the caller didn't give
+
+
+# ── Process-wide index ────────────────────────────────────────────────
+_index: ResponseIndex | None = None
+
+
+def get_index() -> ResponseIndex:
+    global _index
+    if _index is None:
+        t0 = time.perf_counter()
+        _index = ResponseIndex.from_jsonl()
+        logger.info(
+            "Canned index: %d prompts, %d n-grams in %.0f ms",
+            len(_index.keys), len(_index.vocab), (time.perf_counter() - t0) * 1000,
+        )
+    return _index
+
+
+def answer(text: str, intake_done: bool = False) -> str | None:
+    """Confident local answer for `text`, else None (go to the LLM).
+    `intake_done`: the caller already gave name and phone."""
+    response, score = get_index().lookup(text, intake_done)
+    if response is None:
+        COUNTERS["misses"] += 1
+    elif score >= 1.0:
+        COUNTERS["exact"] += 1
+    else:
+        COUNTERS["fuzzy"] += 1
+    worker_status.publish("canned", dict(COUNTERS), min_interval=2.0)
+    return response
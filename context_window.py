@@ -0,0 +1,101 @@
+"""
+context_window.py – keep the prompt sent to the LLM a fixed size
+What the LLM sees each turn:
+    system prompt  +  running structured summary  +  last K turns verbatim
+Older turns are folded into the summary by the small helper LLM in a
+background task, so summarization never sits on the reply's critical path.
+Until a fold finishes the pending turns are still sent verbatim, as far as
+CONTEXT_BUDGET_TOKENS allows; if a fold lags that far behind, the oldest
+pending turns are left out of the prompt until it catches up.
+"""
+import os
+import asyncio
+import logging
+
+from livekit.agents import llm
+
+import groq_scheduler
+
+logger = logging.getLogger("context-window")
+
+KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))           # user+assistant pairs
+BUDGET_TOKENS = int(os.getenv("CONTEXT_BUDGET_TOKENS", "1500"))   # soft cap, ~4 chars/token
+
+SUMMARY_PROMPT = (
+    "You maintain the case notes of a voice health assistant call. "
+    "Update the notes with the new conversation lines. Reply with the notes only, "
+    "in exactly these lines:\n"
+    "Name:\nPhone:\nSymptoms:\nSeverity:\nAdvice given:\nOther:\n"
+    "Keep every line short; write 'unknown' when not mentioned."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def item_text(item) -> str:
+    return getattr(item, "text_content", None) or ""
+
+
+class RollingContext:
+    def __init__(self, summarizer, keep_turns: int = KEEP_TURNS, budget: int = BUDGET_TOKENS) -> None:
+        self.summarizer = summarizer
+        self.keep_messages = keep_turns * 2
+        self.budget = budget
+        self.summary = ""
+        self.folded = 0  # conversation messages already inside `summary`
+        self._task: asyncio.Task | None = None
+
+    def view(self, chat_ctx: llm.ChatContext) -> llm.ChatContext:
+        """The bounded chat context for this turn; schedules a fold if needed."""
+        system = [i for i in chat_ctx.items if getattr(i, "role", None) == "system"]
+        convo = [i for i in chat_ctx.items if getattr(i, "role", None) != "system"]
+
+        window_start = max(len(convo) - self.keep_messages, 0)
+        if window_start > self.folded:
+            self._schedule_fold(convo[self.folded:window_start], window_start)
+
+        recent = convo[min(self.folded, window_start):]
+        # hard stop if a fold is lagging far behind: drop the oldest verbatim lines
+        used = sum(estimate_tokens(item_text(i)) for i in system) + estimate_tokens(self.summary)
+        while len(recent) > self.keep_messages and used + sum(
+            estimate_tokens(item_text(i)) for i in recent
+        ) > self.budget:
+            recent.pop(0)
+
+        items = list(system)
+        if self.summary:
+            items.append(llm.ChatMessage(role="system", content=[f"Call notes so far:\n{self.summary}"]))
+        items.extend(recent)
+        return llm.ChatContext(items=items)
+
+    def _schedule_fold(self, messages: list, upto: int) -> None:
+        if self._task is not None and not self._task.done():
+            return  # one fold at a time; the next turn picks up the rest
+        self._task = asyncio.create_task(self._fold(messages, upto))
+
+    async def _fold(self, messages: list, upto: int) -> None:
+        lines = "\n".join(f"{getattr(m, 'role', '?')}: {item_text(m)}" for m in messages)
+        ctx = llm.ChatContext()
+        ctx.add_message(role="system", content=SUMMARY_PROMPT)
+        ctx.add_message(role="user", content=f"Current notes:\n{self.summary or '(none)'}\n\nNew lines:\n{lines}")
+        tokens = estimate_tokens(SUMMARY_PROMPT) + estimate_tokens(self.summary) + estimate_tokens(lines) + 150
+        parts = []
+        try:
+            async with groq_scheduler.slot(self.summarizer, groq_scheduler.BACKGROUND, tokens), \
+                    self.summarizer.chat(chat_ctx=ctx) as stream:
+                async for chunk in stream:
+                    if chunk.delta and chunk.delta.content:
+                        parts.append(chunk.delta.content)
+        except groq_scheduler.Shed as e:
+            logger.debug(f"Context fold deferred: {e}")
+            return
+        except Exception as e:
+            logger.warning(f"Context summarization failed, keeping turns verbatim: {e}")
+            return
+        summary = "".join(parts).strip()
+        if summary:
+            self.summary = summary
+            self.folded = upto
+            logger.debug(f"Folded {len(messages)} messages into call notes")
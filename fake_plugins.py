@@ -0,0 +1,322 @@
+"""
+fake_plugins.py – local stand-ins for the cloud providers, used by loadtest.py
+• FakeSTT / FakeTTS / FakeLLM / FakeVAD expose the calls the agent and
+  RouterLLM make (update_options, synthesize, chat, complete, …) with
+  configurable latency, token rate and failure injection; nothing touches
+  the network
+• SimSession / FakeJobContext stand in for AgentSession / JobContext so the
+  real `entrypoint`, agent hooks and llm_node can run without a LiveKit room
+"""
+import math
+import time
+import random
+import asyncio
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+from livekit import rtc
+from livekit.agents import ModelSettings, StopResponse, llm
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS
+
+
+class ProviderError(Exception):
+    pass
+
+
+# ── Latency model ─────────────────────────────────────────────────────
+@dataclass
+class Latency:
+    """Log-normal latency with a median and a spread (sigma of the log)."""
+    median: float = 0.2
+    sigma: float = 0.35
+
+    def sample(self) -> float:
+        return self.median * math.exp(random.gauss(0.0, self.sigma))
+
+
+@dataclass
+class FakeConfig:
+    stt: Latency = field(default_factory=lambda: Latency(0.25, 0.3))
+    eou: Latency = field(default_factory=lambda: Latency(0.35, 0.2))
+    llm_ttft: Latency = field(default_factory=lambda: Latency(0.35, 0.5))
+    intent: Latency = field(default_factory=lambda: Latency(0.15, 0.4))
+    tts_ttfb: Latency = field(default_factory=lambda: Latency(0.2, 0.4))
+    tokens_per_s: float = 250.0
+    reply_tokens: int = 60
+    failure_rate: float = 0.0
+    time_scale: float = 0.1  # playout / think time multiplier (latencies are not scaled)
+
+
+def _maybe_fail(cfg: FakeConfig, what: str) -> None:
+    if cfg.failure_rate and random.random() < cfg.failure_rate:
+        raise ProviderError(f"injected {what} failure")
+
+
+# ── Providers ─────────────────────────────────────────────────────────
+class FakeSTT:
+    def __init__(self, cfg: FakeConfig) -> None:
+        self.cfg = cfg
+        self.language = "multi"
+
+    def update_options(self, *, language: str) -> None:
+        self.language = language
+
+
+class _FakeLLMStream:
+    def __init__(self, cfg: FakeConfig, intent: bool = False) -> None:
+        self.cfg = cfg
+        self.intent = intent
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        """Reply tokens after a TTFT, at tokens_per_s; an intent model answers "none"."""
+        if self.intent:
+            await asyncio.sleep(self.cfg.intent.sample())
+            _maybe_fail(self.cfg, "intent LLM")
+            yield llm.ChatChunk(id="fake", delta=llm.ChoiceDelta(role="assistant", content="none"))
+            return
+        await asyncio.sleep(self.cfg.llm_ttft.sample())
+        _maybe_fail(self.cfg, "LLM")
+        for i in range(self.cfg.reply_tokens):
+            yield llm.ChatChunk(id="fake", delta=llm.ChoiceDelta(role="assistant", content=f"tok{i} "))
+            await asyncio.sleep(1.0 / self.cfg.tokens_per_s)
+
+
+class FakeLLM:
+    """A backend behind RouterLLM, or the intent model (intent=True); both
+    only through chat(), like the real clients."""
+    def __init__(self, cfg: FakeConfig, model: str = "fake-llm", intent: bool = False) -> None:
+        self.cfg = cfg
+        self.model = model
+        self.intent = intent
+
+    def chat(self, *, chat_ctx, tools=None, **kwargs) -> _FakeLLMStream:
+        return _FakeLLMStream(self.cfg, self.intent)
+
+
+class _FakeChunkedStream:
+    def __init__(self, tts: "FakeTTS", text: str) -> None:
+        self._tts = tts
+        self._text = text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._frames()
+
+    async def _frames(self):
+        cfg = self._tts.cfg
+        await asyncio.sleep(cfg.tts_ttfb.sample())
+        _maybe_fail(cfg, "TTS")
+        # ~60 ms of audio per word, in 20 ms frames
+        n_frames = max(1, len(self._text.split()) * 3)
+        samples = self._tts.sample_rate // 50
+        for _ in range(n_frames):
+            yield SimpleNamespace(frame=rtc.AudioFrame.create(self._tts.sample_rate, 1, samples))
+
+
+class FakeTTS:
+    sample_rate = 24000
+
+    def __init__(self, cfg: FakeConfig) -> None:
+        self.cfg = cfg
+
+    def synthesize(self, text: str) -> _FakeChunkedStream:
+        return _FakeChunkedStream(self, text)
+
+
+class FakeVAD:
+    @classmethod
+    def load(cls, **kwargs) -> "FakeVAD":
+        return cls()
+
+
+# ── Metrics events (names match livekit.agents.metrics) ──────────────
+@dataclass
+class EOUMetrics:
+    end_of_utterance_delay: float
+    transcription_delay: float
+
+
+@dataclass
+class LLMMetrics:
+    ttft: float
+    duration: float
+
+
+@dataclass
+class TTSMetrics:
+    ttfb: float
+
+
+# ── Session stand-ins ─────────────────────────────────────────────────
+class SimSpeechHandle:
+    def __init__(self, coro) -> None:
+        self._task = asyncio.ensure_future(coro)
+
+    def done(self) -> bool:
+        return self._task.done()
+
+    def interrupt(self) -> None:
+        self._task.cancel()
+
+    @property
+    def interrupted(self) -> bool:
+        return self._task.cancelled()
+
+    def __await__(self):
+        return self._wait().__await__()
+
+    async def _wait(self) -> None:
+        try:
+            await asyncio.shield(self._task)
+        except asyncio.CancelledError:
+            if not self._task.cancelled():
+                raise  # we were cancelled, not the speech
+
+
+class _SimActivity:
+    """What Agent.default.llm_node reads from the agent's activity."""
+    def __init__(self, session: "SimSession", agent) -> None:
+        self.session = session
+        self.agent = agent
+        self.llm = agent.llm
+
+    async def update_chat_ctx(self, chat_ctx) -> None:
+        self.agent._chat_ctx = chat_ctx
+
+
+class SimSession:
+    """Just enough of AgentSession for LanguageSwitcherBase and metrics.attach."""
+    def __init__(self, *args, **kwargs) -> None:
+        self.agent = None
+        self.errors = 0
+        self.conn_options = SimpleNamespace(llm_conn_options=DEFAULT_API_CONNECT_OPTIONS)
+        self._current: SimSpeechHandle | None = None
+        self._handlers: dict[str, list] = {}
+
+    # event emitter
+    def on(self, event: str, callback=None):
+        def register(cb):
+            self._handlers.setdefault(event, []).append(cb)
+            return cb
+        return register(callback) if callback else register
+
+    def emit(self, event: str, ev) -> None:
+        for cb in self._handlers.get(event, []):
+            cb(ev)
+
+    def _state(self, event: str, old: str, new: str) -> None:
+        self.emit(event, SimpleNamespace(old_state=old, new_state=new))
+
+    async def start(self, agent, room=None) -> None:
+        self.agent = agent
+        # Agent.session resolves through its activity; give it a minimal one
+        agent._activity = _SimActivity(self, agent)
+        await agent.on_enter()
+
+    # a finished user turn, handled the way AgentSession does
+    async def user_turn(self, text: str) -> None:
+        message = llm.ChatMessage(role="user", content=[text])
+        try:
+            await self.agent.on_user_turn_completed(self.agent.chat_ctx.copy(), message)
+        except StopResponse:
+            return
+        self.agent._chat_ctx.items.append(message)
+        self._current = self.generate_reply()
+        await self._current
+
+    def interrupt(self) -> None:
+        if self._current is not None and not self._current.done():
+            self._current.interrupt()
+
+    # speech
+    async def _play(self, frames) -> None:
+        first = True
+        try:
+            async for frame in frames:
+                if first:
+                    self._state("agent_state_changed", "thinking", "speaking")
+                    first = False
+                cfg = self.agent.tts.cfg
+                await asyncio.sleep(frame.duration * cfg.time_scale)
+        except ProviderError:
+            self.errors += 1
+        finally:
+            if not first:
+                self._state("agent_state_changed", "speaking", "listening")
+
+    async def _tts_frames(self, text: str):
+        t0 = time.perf_counter()
+        first = True
+        async with self.agent.tts.synthesize(text) as stream:
+            async for ev in stream:
+                if first:
+                    self.emit("metrics_collected", SimpleNamespace(metrics=TTSMetrics(time.perf_counter() - t0)))
+                    first = False
+                yield ev.frame
+
+    def _add_item(self, role: str, text: str) -> None:
+        message = llm.ChatMessage(role=role, content=[text])
+        self.agent._chat_ctx.items.append(message)
+        self.emit("conversation_item_added", SimpleNamespace(item=message))
+
+    def say(self, text: str, *, audio=None, **kwargs) -> SimSpeechHandle:
+        self._add_item("assistant", text)
+        return SimSpeechHandle(self._play(audio if audio is not None else self._tts_frames(text)))
+
+    def generate_reply(self, **kwargs) -> SimSpeechHandle:
+        return SimSpeechHandle(self._reply())
+
+    async def _reply(self) -> None:
+        """The agent's llm_node (context window → RouterLLM → backend), then TTS."""
+        t0 = time.perf_counter()
+        ttft = None
+        tokens = []
+        try:
+            async for chunk in self.agent.llm_node(self.agent.chat_ctx.copy(), [], ModelSettings()):
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                tokens.append(chunk if isinstance(chunk, str) else (chunk.delta and chunk.delta.content) or "")
+        except Exception:  # router gave up: ProviderError / APIConnectionError
+            self.errors += 1
+            return
+        self.emit("metrics_collected", SimpleNamespace(
+            metrics=LLMMetrics(ttft=ttft or 0.0, duration=time.perf_counter() - t0)))
+        text = "".join(tokens)
+        self._add_item("assistant", text)
+        await self._play(self._tts_frames(text))
+
+    async def aclose(self) -> None:
+        if self.agent is not None:
+            await self.agent.on_exit()
+
+
+class FakeJobContext:
+    def __init__(self, job_id: str, proc) -> None:
+        self.job = SimpleNamespace(id=job_id)
+        self.room = SimpleNamespace(name=f"room-{job_id}")
+        self.proc = proc
+        self._shutdown = []
+
+    async def connect(self) -> None:
+        return None
+
+    def add_shutdown_callback(self, cb) -> None:
+        self._shutdown.append(cb)
+
+    async def shutdown(self) -> None:
+        for cb in self._shutdown:
+            await cb()
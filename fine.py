@@ -4,19 +4,253 @@ Simple Ollama Llama 3.2 Health Assistant Fine-Tuning Script
 Direct fine-tuning using your existing JSONL dataset
 """
 
+import re
 import json
+import asyncio
+import time
+import hashlib
+import threading
 import subprocess
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from canned import extract_slots, templatize
+from intent import normalize
+
+# System prompt for the training examples; written once at the top of the output
+TRAINING_SYSTEM = """You are *SwasthyaMate*, a friendly AI health assistant. 
+Your goal is to provide helpful, non-judgmental responses to users' health-related queries. 
+Collect user details first, classify symptom severity, and offer both natural and modern treatment suggestions. 
+Always use gentle, caring language. Avoid diagnosing; use phrases like "this could be" or "you may be experiencing".
+Note: only maximum 60-80 tokens you will be genrating per response"""
+
+DEDUP_THRESHOLD = 0.8              # estimated Jaccard above which two dialogues are duplicates
+USER_DEDUP_THRESHOLD = 0.8         # ...and the user turns alone must be this similar (exact Jaccard)
+MINHASH_BANDS, MINHASH_ROWS = 8, 8  # 64 hashes; LSH candidate threshold ~ (1/8)^(1/8) = 0.77
+HOLDOUT_EVERY = 10                 # 1-in-N records (by content hash) kept out of training for evals
+CHUNK_RECORDS = 2000                 # records per worker task
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024  # below this, converting in-process is faster
+
+
+# ── Dataset conversion (module level so worker processes can import it) ──
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _read_records(path):
+    """Yield (line number, content hash, raw line) without loading the file"""
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if line:
+                yield lineno, _digest(line)[:20], line
+
+
+def is_holdout(record_id, every=HOLDOUT_EVERY):
+    """True for the held-out slice model_eval scores against; never trained on"""
+    return int(record_id, 16) % every == 0
+
+
+def convert_record(record_id, raw):
+    """One paste.txt line -> one chat JSONL line, or {"error": ...}"""
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError as e:
+        return {"error": f"not JSON ({e.msg})"}
+    prompt, response = data.get("prompt"), data.get("response")
+    if not isinstance(prompt, str) or not isinstance(response, str):
+        return {"error": "prompt/response missing"}
+    if "User:" not in prompt or "Assistant:" not in prompt:
+        return {"error": "prompt has no User:/Assistant: turn"}
+
+    user_input = prompt.split("User:")[1].split("Assistant:")[0].strip()
+    if not user_input or not response.strip():
+        return {"error": "empty user input or response"}
+    return json.dumps({
+        "id": record_id,
+        "messages": [
+            {"role": "user", "content": user_input},
+            {"role": "assistant", "content": response.strip()},
+        ],
+    }, ensure_ascii=False) + "\n"
+
+
+def _convert_chunk(items):
+    return [convert_record(record_id, raw) for record_id, raw in items]
+
+
+def _chunks(records, size=CHUNK_RECORDS):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _convert_stream(records, previous, pool=None):
+    """Yield (chunk, results) in input order; only unseen records are converted.
+    With a pool, at most a few chunks are in flight so memory stays flat."""
+    def todo(chunk):
+        return [(record_id, raw) for _, record_id, raw in chunk if record_id not in previous]
+
+    def merge(chunk, converted):
+        converted = iter(converted)
+        return [None if record_id in previous else next(converted) for _, record_id, _ in chunk]
+
+    if pool is None:
+        for chunk in _chunks(records):
+            yield chunk, merge(chunk, _convert_chunk(todo(chunk)))
+        return
+
+    pending = deque()
+    window = 2 * (os.cpu_count() or 1)
+    for chunk in _chunks(records):
+        pending.append((chunk, pool.submit(_convert_chunk, todo(chunk))))
+        if len(pending) >= window:
+            chunk, future = pending.popleft()
+            yield chunk, merge(chunk, future.result())
+    while pending:
+        chunk, future = pending.popleft()
+        yield chunk, merge(chunk, future.result())
+
+
+def _index_previous(path):
+    """Record id -> byte offset of its line in the last build's output"""
+    index = {}
+    if not os.path.exists(path):
+        return index
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            if line.startswith(b'{"id": "'):
+                index[line[8:28].decode("ascii")] = offset
+            offset += len(line)
+    return index
+
+
+# ── Near-duplicate detection ──────────────────────────────────────────
+_MERSENNE = (1 << 61) - 1
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(b"a%d" % i, digest_size=8).digest(), "big") % _MERSENNE | 1,
+     int.from_bytes(hashlib.blake2b(b"b%d" % i, digest_size=8).digest(), "big") % _MERSENNE)
+    for i in range(MINHASH_BANDS * MINHASH_ROWS)
+]
+
+
+def dedup_key(user, assistant):
+    """Normalized text with names / phone numbers replaced by placeholders"""
+    slots = extract_slots(user)
+    return normalize(templatize(user, slots)), normalize(templatize(assistant, slots))
+
+
+def _shingles(text, tag):
+    words = text.split()
+    grams = zip(words, words[1:], words[2:]) if len(words) >= 3 else [tuple(words)]
+    return {tag + " ".join(g) for g in grams}
+
+
+# Openers that differ only in wording ("Hi" / "Good evening") count as one
+_GREETING_RE = re.compile(r"^(?:hi|hello|hey|hiya|namaste|good (?:morning|afternoon|evening|day))(?: there)?$")
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def minhash(user, assistant):
+    shingles = _shingles(user, "u:") | _shingles(assistant, "a:")
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in shingles]
+    return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMUTATIONS)
+
+
+class NearDuplicateIndex:
+    """Exact hash of the normalized pair, then MinHash + LSH banding for near
+    duplicates. Each record is checked against the kept records sharing one of
+    its bands, so the whole pass stays close to linear in the corpus size.
+    A shared long response must not make different complaints duplicates:
+    a candidate also needs a similar user turn (or both are greetings)."""
+    def __init__(self, threshold=DEDUP_THRESHOLD, user_threshold=USER_DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self.user_threshold = user_threshold
+        self.exact = set()
+        self.signatures = []
+        self.users = []  # (user shingles, is greeting) per kept record
+        self.buckets = [{} for _ in range(MINHASH_BANDS)]
+
+    def _bands(self, signature):
+        for i in range(MINHASH_BANDS):
+            yield i, signature[i * MINHASH_ROWS:(i + 1) * MINHASH_ROWS]
+
+    def add(self, user, assistant):
+        """Returns "exact", "near" or None (new; kept as a representative)"""
+        key = dedup_key(user, assistant)
+        digest = _digest("\x1f".join(key))
+        if digest in self.exact:
+            return "exact"
+        self.exact.add(digest)
+
+        signature = minhash(*key)
+        user = (_shingles(key[0], ""), bool(_GREETING_RE.match(key[0])))
+        candidates = set()
+        for i, band in self._bands(signature):
+            candidates.update(self.buckets[i].get(band, ()))
+        for c in candidates:
+            other = self.signatures[c]
+            if sum(x == y for x, y in zip(signature, other)) / len(signature) < self.threshold:
+                continue
+            other_shingles, other_greeting = self.users[c]
+            if (user[1] and other_greeting) or _jaccard(user[0], other_shingles) >= self.user_threshold:
+                return "near"
+
+        ref = len(self.signatures)
+        self.signatures.append(signature)
+        self.users.append(user)
+        for i, band in self._bands(signature):
+            self.buckets[i].setdefault(band, []).append(ref)
+        return None
+
+
+def _load_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_state(path, state):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
 
 class SimpleHealthFineTuner:
     def __init__(self, jsonl_file="paste.txt"):
         self.jsonl_file = jsonl_file
         self.base_model = "llama3.2"
         self.fine_tuned_model = "health-assistantv3"
+        self.training_file = "health_training.jsonl"
+        self.state_file = "health_training.state.json"
+        self.dedup_file = "health_training.dedup.jsonl"
+        self.manifest_file = "build_manifest.json"
+        self.manifest = {}
         
-    def create_modelfile(self):
-        """Create Modelfile for the health assistant"""
-        modelfile_content = f"""FROM {self.base_model}
+    def modelfile_content(self):
+        """Modelfile text for the health assistant"""
+        return f"""FROM {self.base_model}
 
 SYSTEM \"\"\"You are *LokSwastya*, a warm, conversational AI health assistant.  
 Your personality: friendly, empathetic, easy to understand, never judgmental. only maximum 60-80 tokens you will be generating per response. only exceed more when asking for user information at first
@@ -43,51 +277,105 @@ PARAMETER temperature 0.7
 PARAMETER top_p 0.9
 PARAMETER repeat_penalty 1.1
 """
-        
+
+    def create_modelfile(self):
+        """Create Modelfile for the health assistant (untouched if unchanged)"""
+        content = self.modelfile_content()
+        if os.path.exists('Modelfile'):
+            with open('Modelfile', 'r', encoding="utf-8") as f:
+                if f.read() == content:
+                    print("✅ Modelfile unchanged")
+                    return content
         with open('Modelfile', 'w', encoding="utf-8") as f:
-            f.write(modelfile_content)
+            f.write(content)
         print("✅ Modelfile created")
+        return content
     
     def convert_jsonl_to_training_format(self):
-        """Convert your JSONL to Ollama training format"""
-        training_examples = []
-        
-        with open(self.jsonl_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    data = json.loads(line)
-                    
-                    # Extract user input and assistant response
-                    prompt = data['prompt']
-                    response = data['response']
-                    
-                    # Parse the prompt to get user input
-                    if "User:" in prompt and "Assistant:" in prompt:
-                        user_input = prompt.split("User:")[1].split("Assistant:")[0].strip()
-                        
-                        # Format for training
-                        training_example = f"""### System:
-You are *SwasthyaMate*, a friendly AI health assistant. 
-Your goal is to provide helpful, non-judgmental responses to users' health-related queries. 
-Collect user details first, classify symptom severity, and offer both natural and modern treatment suggestions. 
-Always use gentle, caring language. Avoid diagnosing; use phrases like "this could be" or "you may be experiencing".
-Note: only maximum 60-80 tokens you will be genrating per response
-### User:
-{user_input}
+        """Convert your JSONL to chat-style training JSONL (incremental, streaming)
 
-### Assistant:
-{response}
-"""
+        Output: one header line holding the system prompt, then one
+        {"id", "messages"} record per dialogue. Records whose content hash
+        was already converted last run are copied over, not re-parsed.
+        The held-out slice (is_holdout) is left out.
+        """
+        input_hash = _file_digest(self.jsonl_file)
+        state = _load_state(self.state_file)
+        if (state.get("input") == input_hash and state.get("system") == _digest(TRAINING_SYSTEM)
+                and state.get("holdout") == HOLDOUT_EVERY and os.path.exists(self.training_file)):
+            print(f"✅ Training data up to date ({state['examples']} examples)")
+            return state["examples"]
+
+        previous = _index_previous(self.training_file)
+        parallel = os.path.getsize(self.jsonl_file) >= PARALLEL_MIN_BYTES
+        stats = {"examples": 0, "reused": 0, "converted": 0, "invalid": 0, "held_out": 0}
+        tmp = f"{self.training_file}.tmp"
+
+        def training_records():
+            for lineno, record_id, raw in _read_records(self.jsonl_file):
+                if is_holdout(record_id):
+                    stats["held_out"] += 1
+                    continue
+                yield lineno, record_id, raw
+
+        with open(tmp, "w", encoding="utf-8") as out, \
+                open(self.training_file, "rb") if previous else nullcontext() as old, \
+                ProcessPoolExecutor() if parallel else nullcontext() as pool:
+            out.write(json.dumps({"system": TRAINING_SYSTEM}, ensure_ascii=False) + "\n")
+            for chunk, results in _convert_stream(training_records(), previous, pool):
+                for (lineno, record_id, raw), result in zip(chunk, results):
+                    if record_id in previous:
+                        old.seek(previous[record_id])
+                        out.write(old.readline().decode("utf-8"))
+                        stats["reused"] += 1
+                    elif isinstance(result, str):
+                        out.write(result)
+                        stats["converted"] += 1
+                    else:
+                        stats["invalid"] += 1
+                        if stats["invalid"] <= 5:
+                            print(f"⚠️  {self.jsonl_file}:{lineno}: {result['error']}")
+                        continue
+                    stats["examples"] += 1
+        os.replace(tmp, self.training_file)
+
+        _save_state(self.state_file, {"input": input_hash, "system": _digest(TRAINING_SYSTEM),
+                                      "holdout": HOLDOUT_EVERY, "examples": stats["examples"]})
+        print(f"✅ Converted {stats['examples']} training examples "
+              f"({stats['converted']} new, {stats['reused']} unchanged, {stats['invalid']} invalid, "
+              f"{stats['held_out']} held out)")
+        return stats["examples"]
+
+    def dedup_training_data(self, threshold=DEDUP_THRESHOLD):
+        """Drop exact and near-duplicate dialogues from the converted set"""
+        index = NearDuplicateIndex(threshold)
+        stats = {"kept": 0, "exact": 0, "near": 0, "held_out": 0}
+        tmp = f"{self.dedup_file}.tmp"
+        with open(self.training_file, "r", encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as out:
+            for line in src:
+                record = json.loads(line)
+                if "messages" not in record:
+                    out.write(line)  # system header
+                    continue
+                if is_holdout(record["id"]):  # a training file from before the split
+                    stats["held_out"] += 1
+                    continue
+                user, assistant = (m["content"] for m in record["messages"])
+                duplicate = index.add(user, assistant)
+                if duplicate:
+                    stats[duplicate] += 1
+                    continue
+                out.write(line)
+                stats["kept"] += 1
+        os.replace(tmp, self.dedup_file)
+
+        total = stats["kept"] + stats["exact"] + stats["near"]
+        ratio = total / stats["kept"] if stats["kept"] else 0.0
+        print(f"✅ Deduplicated {total} → {stats['kept']} examples "
+              f"({stats['exact']} exact, {stats['near']} near duplicates, {stats['held_out']} held out; "
+              f"compaction {ratio:.2f}x)")
+        return stats["kept"]
 
-                        training_examples.append(training_example)
-        
-        # Save training data
-        with open('health_training.txt', 'w', encoding='utf-8') as f:
-            f.writelines(training_examples)
-        
-        print(f"✅ Converted {len(training_examples)} training examples")
-        return len(training_examples)
-    
     def pull_base_model(self):
         """Pull base Llama 3.2 model"""
         print(f"📥 Pulling {self.base_model}...")
@@ -112,25 +400,57 @@ Note: only maximum 60-80 tokens you will be genrating per response
             print(f"❌ Failed to create model: {e.stderr}")
             return False
     
-    def test_model(self):
-        """Quick test of the fine-tuned model"""
-        print("🧪 Testing model...")
-        test_input = "Hi there"
-        
+    def local_models(self):
+        """name -> digest prefix of every model Ollama has locally"""
         try:
-            result = subprocess.run(['ollama', 'run', self.fine_tuned_model], 
-                                  input=test_input, 
-                                  capture_output=True, text=True, timeout=30)
-            
-            print("📋 Test Response:")
-            print("-" * 40)
-            print(result.stdout)
-            print("-" * 40)
-            return True
+            result = subprocess.run(['ollama', 'list'], capture_output=True, text=True, check=True)
+        except (OSError, subprocess.CalledProcessError):
+            return {}
+        models = {}
+        for line in result.stdout.splitlines()[1:]:
+            parts = line.split()
+            if len(parts) >= 2:
+                models[parts[0]] = parts[1]
+                models.setdefault(parts[0].removesuffix(":latest"), parts[1])
+        return models
+
+    def _step(self, name, key, action, previous_keys, force=False):
+        """Run `action` unless the previous build ran it with the same key.
+        Returns (ran, result); result is None when the step was skipped."""
+        t0 = time.perf_counter()
+        ran = force or previous_keys.get(name) != key
+        if ran:
+            result = action()
+        else:
+            print(f"⏭️  {name}: inputs unchanged, skipped")
+            result = None
+        self.manifest["steps"].append({
+            "name": name,
+            "key": key,
+            "ran": ran,
+            "ok": not ran or bool(result),
+            "seconds": round(time.perf_counter() - t0, 3),
+        })
+        return ran, result
+
+    def test_model(self, compare_base=False, concurrency=4):
+        """Replay held-out dialogues against the model (see model_eval.py)"""
+        import model_eval  # imports this module; aiohttp only needed here
+
+        models = [self.fine_tuned_model] + ([self.base_model] if compare_base else [])
+        try:
+            reports = asyncio.run(model_eval.run(models, self.jsonl_file, concurrency=concurrency))
         except Exception as e:
             print(f"❌ Test failed: {e}")
             return False
+        return all(r["summary"]["errors"] == 0 for r in reports)
     
+    def _save_manifest(self):
+        self.manifest["seconds"] = round(time.time() - self.manifest["started_at"], 3)
+        _save_state(self.manifest_file, self.manifest)
+        ran = [step["name"] for step in self.manifest["steps"] if step["ran"]]
+        print(f"📝 Build manifest: {self.manifest_file} (ran: {', '.join(ran) or 'nothing'})")
+
     def fine_tune(self):
         """Complete fine-tuning process"""
         print("🚀 Starting Health Assistant Fine-Tuning")
@@ -141,23 +461,59 @@ Note: only maximum 60-80 tokens you will be genrating per response
             print(f"❌ JSONL file '{self.jsonl_file}' not found")
             return False
         
-        # Step 1: Convert training data
-        examples_count = self.convert_jsonl_to_training_format()
+        previous = _load_state(self.manifest_file)
+        previous_keys = {step["name"]: step["key"] for step in previous.get("steps", []) if step["ok"]}
+        self.manifest = {"started_at": time.time(), "model": self.fine_tuned_model, "steps": []}
+        models = self.local_models()
+
+        # Step 1: Pull base model, in the background while the data is prepared
+        pulled = {}
+
+        def _pull():
+            ran, ok = self._step("pull", self.base_model, self.pull_base_model, previous_keys,
+                                 force=self.base_model not in models)
+            pulled["ok"] = not ran or ok
+
+        pull = threading.Thread(target=_pull, name="ollama-pull")
+        pull.start()
+
+        # Step 2: Convert + dedup training data
+        _, examples_count = self._step("convert", _file_digest(self.jsonl_file),
+                                       self.convert_jsonl_to_training_format, previous_keys, force=True)
         if examples_count == 0:
             print("❌ No training examples found")
+            pull.join()
             return False
-        
-        # Step 2: Pull base model
-        if not self.pull_base_model():
+        dedup_key = _digest(f"{_file_digest(self.training_file)}:{DEDUP_THRESHOLD}")
+        ran, examples_count = self._step("dedup", dedup_key, self.dedup_training_data, previous_keys,
+                                         force=not os.path.exists(self.dedup_file))
+        if not ran:  # the last build's output is still valid
+            with open(self.dedup_file, "r", encoding="utf-8") as f:
+                examples_count = sum(1 for _ in f) - 1  # minus the system header
+
+        pull.join()
+        if not pulled.get("ok"):
+            self._save_manifest()
             return False
-        
+
         # Step 3: Create Modelfile
-        self.create_modelfile()
-        
-        # Step 4: Create fine-tuned model
-        if not self.create_fine_tuned_model():
+        modelfile = self.create_modelfile()
+
+        # Step 4: Create fine-tuned model, keyed by everything that goes into it
+        models = self.local_models()
+        create_key = _digest(json.dumps({
+            "base": models.get(self.base_model, self.base_model),
+            "modelfile": _digest(modelfile),
+            "data": _file_digest(self.dedup_file),
+            "model": self.fine_tuned_model,
+        }, sort_keys=True))
+        ran, created = self._step("create", create_key, self.create_fine_tuned_model, previous_keys,
+                                  force=self.fine_tuned_model not in models)
+        if ran and not created:
+            self._save_manifest()
             return False
-        
+        self._save_manifest()
+
         # Step 5: Test model
         self.test_model()
         
@@ -0,0 +1,218 @@
+"""
+groq_scheduler.py – share one GROQ_API_KEY's rate limits between sessions
+Every Groq call (replies, intent checks, call-notes summaries) first takes a
+slot from a token bucket pair per model: requests/minute and tokens/minute.
+• Priority classes: emergency > first turn > reply > intent > background.
+  Within a process waiters are served best class first; across processes
+  each class keeps a reserve free for the classes above it
+• Intent checks and summaries are shed (Shed raised) when the buckets drop
+  into their reserve and the wait would exceed GROQ_SHED_WAIT_MS, so the
+  limit is reached by the calls a caller would actually hear
+• A 429 empties the buckets and pauses the model for GROQ_429_BACKOFF_S
+• Queue wait goes to the stage histogram as stage="groq_queue"
+With GROQ_SHARED_LIMITS=1 the bucket state lives in a flock'd file under the
+status dir, so every job process and worker on the host draws from the same
+buckets; LiveKit runs each session in its own process, so that is the default.
+The scheduler is off until GROQ_RPM and GROQ_TPM are set (Groq's limits
+depend on the plan and model); until then, and for clients that are not
+Groq, calls pass straight through.
+"""
+import os
+import json
+import time
+import fcntl
+import heapq
+import asyncio
+import logging
+import itertools
+import contextvars
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import metrics
+import worker_status
+
+logger = logging.getLogger("groq-scheduler")
+
+RPM = int(os.getenv("GROQ_RPM") or 0)
+TPM = int(os.getenv("GROQ_TPM") or 0)
+ENABLED = RPM > 0 and TPM > 0
+SHARED = os.getenv("GROQ_SHARED_LIMITS", "1").lower() in ("1", "true", "yes")
+SHED_RESERVE = float(os.getenv("GROQ_SHED_RESERVE", "0.2"))
+SHED_WAIT = float(os.getenv("GROQ_SHED_WAIT_MS", "300")) / 1000
+BACKOFF = float(os.getenv("GROQ_429_BACKOFF_S", "2"))
+POLL = 0.02       # how often a waiter behind another one looks again; also the shortest sleep
+MAX_SLEEP = 0.25  # re-check at least this often (other processes refill/drain too)
+
+# ── Priority classes ──────────────────────────────────────────────────
+EMERGENCY, FIRST_TURN, REPLY, INTENT, BACKGROUND = range(5)
+CLASS_NAMES = ("emergency", "first_turn", "reply", "intent", "background")
+# fraction of each bucket a class must leave for the classes above it
+RESERVE = (0.0, 0.0, SHED_RESERVE / 4, SHED_RESERVE, SHED_RESERVE * 2)
+SHEDDABLE = (INTENT, BACKGROUND)
+
+# The class of the Groq calls made from the current task; the agent sets it
+# in llm_node, which runs in the reply's own task.
+PRIORITY: contextvars.ContextVar[int] = contextvars.ContextVar("groq_priority", default=REPLY)
+
+# Process-wide counters: granted_<class>, waited_<class>, shed_<class>, rate_limited
+COUNTERS: Counter = Counter()
+
+
+class Shed(Exception):
+    """A low-priority call was dropped to keep headroom for replies."""
+
+
+# ── Bucket state ──────────────────────────────────────────────────────
+class _LocalState:
+    def __init__(self, fresh: dict) -> None:
+        self._state = dict(fresh)
+
+    async def update(self, fn):
+        return fn(self._state)
+
+
+class _SharedState:
+    """The same dict, kept in a JSON file and changed under an exclusive flock.
+    The lock and file I/O block, so they run in a thread, not on the event loop."""
+    def __init__(self, path: str, fresh: dict) -> None:
+        self.path = path
+        self._fresh = fresh
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    async def update(self, fn):
+        return await asyncio.to_thread(self._update, fn)
+
+    def _update(self, fn):
+        with open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                try:
+                    state = json.loads(raw) if raw else dict(self._fresh)
+                except json.JSONDecodeError:
+                    state = dict(self._fresh)
+                result = fn(state)
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ── Scheduler ─────────────────────────────────────────────────────────
+class Scheduler:
+    """Token buckets for one Groq model (Groq counts its limits per model)."""
+    def __init__(self, model: str, rpm: int = RPM, tpm: int = TPM, shared: bool = SHARED) -> None:
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        fresh = {"requests": float(rpm), "tokens": float(tpm), "at": time.time(), "blocked_until": 0.0}
+        self._state = _LocalState(fresh)
+        if shared:
+            path = os.path.join(worker_status.STATUS_DIR, "groq", f"{model.replace('/', '_')}.json")
+            try:
+                self._state = _SharedState(path, fresh)
+            except OSError as e:
+                logger.warning(f"Groq limits for {model} stay per process: {e}")
+        self._waiting: list[tuple[int, int]] = []  # heap of (class, arrival)
+        self._seq = itertools.count()
+
+    def _take(self, state: dict, priority: int, tokens: int) -> float:
+        """Take one request + `tokens` if the class may; else seconds until it could."""
+        now = time.time()
+        elapsed = max(now - state["at"], 0.0)
+        state["requests"] = min(state["requests"] + elapsed * self.rpm / 60, self.rpm)
+        state["tokens"] = min(state["tokens"] + elapsed * self.tpm / 60, self.tpm)
+        state["at"] = now
+        if now < state["blocked_until"]:
+            return state["blocked_until"] - now
+
+        reserve = RESERVE[priority]
+        short_requests = 1 + reserve * self.rpm - state["requests"]
+        short_tokens = min(tokens, self.tpm) + reserve * self.tpm - state["tokens"]
+        if short_requests <= 0 and short_tokens <= 0:
+            state["requests"] -= 1
+            state["tokens"] -= min(tokens, self.tpm)
+            return 0.0
+        return max(short_requests * 60 / self.rpm, short_tokens * 60 / self.tpm, 0.001)
+
+    async def acquire(self, priority: int, tokens: int) -> float:
+        """Wait for a slot; returns the queue wait. Raises Shed for low classes."""
+        name = CLASS_NAMES[priority]
+        ticket = (priority, next(self._seq))
+        heapq.heappush(self._waiting, ticket)
+        t0 = time.monotonic()
+        try:
+            while True:
+                if self._waiting[0] == ticket:
+                    wait = await self._state.update(lambda s: self._take(s, priority, tokens))
+                    if not wait:
+                        break
+                else:
+                    wait = POLL
+                if priority in SHEDDABLE and time.monotonic() - t0 + wait > SHED_WAIT:
+                    COUNTERS[f"shed_{name}"] += 1
+                    raise Shed(f"{name} call to {self.model} shed ({wait:.1f} s to a slot)")
+                await asyncio.sleep(min(max(wait, POLL), MAX_SLEEP))
+        finally:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            worker_status.publish("groq_scheduler", dict(COUNTERS), min_interval=5.0)
+
+        waited = time.monotonic() - t0
+        COUNTERS[f"granted_{name}"] += 1
+        if waited > POLL:
+            COUNTERS[f"waited_{name}"] += 1
+        metrics.observe(metrics.STAGE_METRIC, waited, stage="groq_queue", provider=name)
+        return waited
+
+    async def rate_limited(self) -> None:
+        """Groq said 429: our estimate was optimistic, start again from empty."""
+        COUNTERS["rate_limited"] += 1
+        logger.warning(f"Groq rate limit hit on {self.model}; pausing {BACKOFF:.1f} s")
+
+        def drain(state: dict) -> None:
+            state["requests"] = state["tokens"] = 0.0
+            state["blocked_until"] = max(state["blocked_until"], time.time() + BACKOFF)
+
+        await self._state.update(drain)
+
+    @asynccontextmanager
+    async def slot(self, priority: int, tokens: int):
+        await self.acquire(priority, tokens)
+        try:
+            yield
+        except Exception as e:
+            if getattr(e, "status_code", None) == 429:
+                await self.rate_limited()
+            raise
+
+
+# ── Process singletons ────────────────────────────────────────────────
+_schedulers: dict[str, Scheduler] = {}
+
+
+def for_client(client) -> Scheduler | None:
+    """The shared scheduler for a Groq plugin client; None for anything else,
+    or when no limits are configured."""
+    if not ENABLED or not type(client).__module__.startswith("livekit.plugins.groq"):
+        return None
+    model = getattr(client, "model", None) or "default"
+    scheduler = _schedulers.get(model)
+    if scheduler is None:
+        scheduler = _schedulers[model] = Scheduler(model)
+    return scheduler
+
+
+@asynccontextmanager
+async def slot(client, priority: int | None = None, tokens: int = 0):
+    """Hold a slot for one call on `client`; the class defaults to PRIORITY."""
+    scheduler = for_client(client)
+    if scheduler is None:
+        yield
+        return
+    async with scheduler.slot(PRIORITY.get() if priority is None else priority, tokens):
+        yield
@@ -0,0 +1,137 @@
+"""
+health_report.py – build the caller's health report as the call goes
+Nothing here calls an LLM:
+• user turns: regex capture of name / phone, symptom sentences
+• assistant turns: severity, category and suggestion sentences picked out
+  of each reply (the replies follow the paste.txt phrasing:
+  "This appears to be a mild digestive issue. Try ginger tea, ...").
+  Severity is read from that lead sentence only, and not when negated
+  ("this is not an emergency")
+The finished report is assembled locally when the session ends.
+"""
+import re
+import time
+
+from canned import SYMPTOM_RE, extract_slots
+
+SEVERITY_ORDER = {"mild": 1, "serious": 2, "emergency": 3}
+
+_SEVERITY_RE = re.compile(r"\b(mild|serious|emergency)\b", re.I)
+# "This appears to be …" / "This could be …" / "It's …": the grading clause
+_LEAD_RE = re.compile(
+    r"^\s*(?:this|that|it)(?:'s|\s+is|\s+(?:appears|seems|could|may|might|sounds|looks)\b)([^.!?]*)",
+    re.I,
+)
+_NEGATION_RE = re.compile(r"\b(?:not|no|never)\b|n't\b", re.I)
+_CATEGORY_RE = re.compile(
+    r"\b(?:mild|serious)\s+([a-z -]+?)\s+(?:symptom|issue|condition|infection)s?\b"
+    r"|\b(?:a|an)\s+([a-z -]+?)\s+emergency\b",
+    re.I,
+)
+_SUGGESTION_RE = re.compile(
+    r"(?:^|(?<=[.!?]\s))((?:Try|Consider|Avoid|Apply|Stay|Rest|Take|Use|Practice|Drink|Eat|"
+    r"Monitor|Keep|Please call|Go to|See|Visit|Seek)\b[^.!?]*[.!?])",
+)
+# An explicit ask at the start of the turn ("Can I get my report", "Please read
+# me the summary"), not any mention ("My report came back and ...")
+_REPORT_REQUEST_RE = re.compile(
+    r"^\W*(?:(?:please|ok(?:ay)?|so|now|and|hi|hello)\W+)*"
+    r"(?:(?:can|could|would|will|may)\s+(?:i|you|we)\s+(?:please\s+)?"
+    r"|i(?:\s+(?:want|need|would\s+like)|['’]d\s+like)(?:\s+to)?)?"
+    r"(?:\s*\b(?:get|have|hear|see|give|send|read|generate|show|share|tell|make))?"
+    r"(?:\s*\b(?:me|us|out|back|please|the|a|my|your|full|final|health|call))*"
+    r"\s*\b(?:report|summary)\b(?:\s+please)?\W*$",
+    re.I,
+)
+
+
+def is_report_request(text: str) -> bool:
+    return bool(_REPORT_REQUEST_RE.search(text))
+
+
+def lead_severity(text: str) -> str | None:
+    """The severity a reply's opening sentence grades the symptom as, if any."""
+    m = _LEAD_RE.match(text)
+    if not m:
+        return None
+    clause = m.group(1)
+    found = [
+        sev.group(1).lower() for sev in _SEVERITY_RE.finditer(clause)
+        if not _NEGATION_RE.search(clause[:sev.start()])
+    ]
+    return max(found, key=SEVERITY_ORDER.get, default=None)
+
+
+class ReportBuilder:
+    def __init__(self, session_id: str) -> None:
+        self.session_id = session_id
+        self.started_at = time.time()
+        self.name: str | None = None
+        self.phone: str | None = None
+        self.language = "en"
+        self.symptoms: list[str] = []
+        self.severity: str | None = None
+        self.category: str | None = None
+        self.suggestions: list[str] = []
+        self.emergency = False
+
+    def observe_user(self, text: str) -> None:
+        slots = extract_slots(text)
+        self.name = slots.get("name", self.name)
+        self.phone = slots.get("phone", self.phone)
+        if not slots and not is_report_request(text) and SYMPTOM_RE.search(text):
+            if text not in self.symptoms:
+                self.symptoms.append(text.strip())
+
+    def observe_assistant(self, text: str) -> None:
+        severity = lead_severity(text)
+        if severity:
+            self._raise_severity(severity)
+        m = _CATEGORY_RE.search(text)
+        if m:
+            self.category = (m.group(1) or m.group(2)).strip().lower()
+        for s in _SUGGESTION_RE.findall(text):
+            s = s.strip()
+            if s not in self.suggestions:
+                self.suggestions.append(s)
+
+    def flag_emergency(self, reason: str | None = None) -> None:
+        self.emergency = True
+        self._raise_severity("emergency")
+        if reason and reason not in self.symptoms:
+            self.symptoms.append(reason)
+
+    def _raise_severity(self, level: str) -> None:
+        if SEVERITY_ORDER[level] > SEVERITY_ORDER.get(self.severity, 0):
+            self.severity = level
+        if level == "emergency":
+            self.emergency = True
+
+    def build(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "started_at": self.started_at,
+            "ended_at": time.time(),
+            "name": self.name,
+            "phone": self.phone,
+            "language": self.language,
+            "symptoms": self.symptoms,
+            "category": self.category,
+            "severity": self.severity,
+            "suggestions": self.suggestions[:8],
+            "emergency": self.emergency,
+        }
+
+    def spoken_summary(self) -> str:
+        """Short read-out when the caller asks for their report mid-call."""
+        parts = [f"Here is your health report{', ' + self.name if self.name else ''}."]
+        if self.symptoms:
+            parts.append(f"You told me about: {'; '.join(self.symptoms[-3:])}.")
+        if self.severity:
+            parts.append(f"This looks {self.severity}.")
+        if self.suggestions:
+            parts.append(" ".join(self.suggestions[:3]))
+        if self.emergency:
+            parts.append("Please seek emergency care right away.")
+        parts.append("A written copy has been saved for you.")
+        return " ".join(parts)
@@ -0,0 +1,332 @@
+"""
+intent.py – language-switch intent detection for the voice agents
+Stages, cheapest first:
+  1. normalise the transcript and look it up in a bounded LRU/TTL cache
+  2. one compiled regex over every language keyword; it only decides for
+     short requests ("Hindi please", "switch to Spanish"); a language name
+     inside a longer sentence may or may not be a switch, so the LLM decides
+  3. local pre-filter: no switch cue word and no language name → not a
+     switch request, no LLM call
+  4. the host-wide decision cache (SQLite under the status dir): each job
+     process serves one call and exits, so LLM answers are shared there
+  5. only then ask the small intent LLM; identical transcripts asked
+     concurrently (several callers saying the same thing) share one request,
+     within a process and across the job processes on the host
+"""
+import os
+import re
+import time
+import asyncio
+import string
+import sqlite3
+import logging
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+import groq_scheduler
+import worker_status
+
+logger = logging.getLogger("stt-intent")
+
+# ── Language tables ──────────────────────────────────────────────────
+LANGUAGE_NAMES = {
+    "en": "English", "es": "Spanish", "fr": "French",
+    "de": "German", "it": "Italian", "hi": "Hindi",
+}
+
+LANGUAGE_KEYWORDS = {
+    "english": "en",
+    "spanish": "es", "español": "es", "espanol": "es",
+    "french": "fr",  "français": "fr", "francais": "fr",
+    "german": "de",  "deutsch": "de",
+    "italian": "it", "italiano": "it",
+    "hindi": "hi",   "हिंदी": "hi", "हिन्दी": "hi",
+}
+
+# Words people use when they ask to change language. A transcript with
+# none of these is an ordinary health question and never reaches the LLM.
+SWITCH_CUES = (
+    "switch", "change", "language", "speak", "talk", "listen", "understand", "prefer",
+    "hablar", "hablas", "hable", "idioma", "parler", "parlez", "parle", "langue",
+    "sprechen", "sprich", "sprache", "parlare", "parla", "lingua",
+    "bhasha", "bolo", "boliye", "baat", "भाषा", "बोल", "बात",
+)
+
+_KEYWORD_RE = re.compile(
+    "|".join(
+        rf"\b{re.escape(k)}\b" if k.isascii() else re.escape(k)
+        for k in sorted(LANGUAGE_KEYWORDS, key=len, reverse=True)
+    )
+)
+_CUE_RE = re.compile(
+    "|".join(rf"\b{re.escape(c)}" if c.isascii() else re.escape(c) for c in SWITCH_CUES)
+)
+# Plain punctuation only: Devanagari vowel signs are not \w, so [^\w\s] would shred Hindi.
+_PUNCT_TABLE = str.maketrans({c: " " for c in string.punctuation + "¿¡“”‘’…।॥"})
+_SPACE_RE = re.compile(r"\s+")
+
+CACHE_SIZE = 1024
+CACHE_TTL = 600.0  # seconds
+SHARED_CACHE_DB = os.path.join(worker_status.STATUS_DIR, "intent_cache.db")
+KEYWORD_MAX_WORDS = 6  # a keyword plus a cue word decides locally up to this length
+CLAIM_LEASE = 5.0      # seconds another process waits on a claimed transcript before asking itself
+CLAIM_POLL = 0.05      # how often it looks for the claimant's answer
+
+# Process-wide counters: hits, shared_hits, misses, keyword, prefiltered, llm_calls, llm_errors,
+# merged, shared_merged, shed, plus speculative / speculative_wasted from the agents' speculative mode
+COUNTERS: Counter = Counter()
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFC", text).lower()
+    text = text.translate(_PUNCT_TABLE)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def stats() -> dict:
+    return dict(COUNTERS)
+
+
+# ── Decision cache ───────────────────────────────────────────────────
+class DecisionCache:
+    """Bounded LRU of normalised transcript → language code (or None), with TTL."""
+    _MISS = object()
+
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL) -> None:
+        self._size = size
+        self._ttl = ttl
+        self._data: OrderedDict[str, tuple[str | None, float]] = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return self._MISS
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return self._MISS
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str | None) -> None:
+        self._data[key] = (value, time.monotonic() + self._ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self._size:
+            self._data.popitem(last=False)
+
+
+class SharedDecisions:
+    """LLM decisions every job process on the host reads and fills, plus the
+    transcripts one of them is asking about right now (a claim with a lease,
+    so a crashed claimant only delays the others). Calls are single SQLite
+    statements; the detector runs them off the event loop."""
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS decisions (key TEXT PRIMARY KEY, code TEXT, expires_at REAL NOT NULL);"
+        "CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, until REAL NOT NULL)"
+    )
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str = SHARED_CACHE_DB, ttl: float = CACHE_TTL) -> None:
+        self.path = path
+        self._ttl = ttl
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=1, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self._SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str):
+        try:
+            with self._lock:
+                row = self._db().execute(
+                    "SELECT code FROM decisions WHERE key = ? AND expires_at > ?", (key, time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared intent cache unavailable: {e}")
+            return DecisionCache._MISS
+        return DecisionCache._MISS if row is None else row[0]
+
+    def put(self, key: str, code: str | None) -> None:
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute("INSERT OR REPLACE INTO decisions VALUES (?, ?, ?)", (key, code, now + self._ttl))
+                db.execute("DELETE FROM claims WHERE key = ?", (key,))
+                self._writes += 1
+                if self._writes % self.PRUNE_EVERY == 0:
+                    db.execute("DELETE FROM decisions WHERE expires_at <= ?", (now,))
+                    db.execute("DELETE FROM claims WHERE until <= ?", (now,))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not share intent decision: {e}")
+
+    def claim(self, key: str, lease: float = CLAIM_LEASE) -> bool:
+        """True if this process should ask the LLM about `key`: nobody else
+        holds an unexpired claim on it. Errors fall back to asking."""
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute("DELETE FROM claims WHERE key = ? AND until <= ?", (key, now))
+                return db.execute("INSERT OR IGNORE INTO claims VALUES (?, ?)", (key, now + lease)).rowcount == 1
+        except sqlite3.Error as e:
+            logger.warning(f"Shared intent cache unavailable: {e}")
+            return True
+
+    def release(self, key: str) -> None:
+        """Give up a claim without a decision, so a waiting process asks itself."""
+        try:
+            with self._lock:
+                self._db().execute("DELETE FROM claims WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not release intent claim: {e}")
+
+
+_cache = DecisionCache()
+_shared = SharedDecisions()
+_FAILED = object()
+# normalised transcript → the LLM request already in flight for it
+_inflight: dict[str, asyncio.Future] = {}
+
+
+# ── Detector ─────────────────────────────────────────────────────────
+def match_keyword(normalized: str) -> str | None:
+    m = _KEYWORD_RE.search(normalized)
+    return LANGUAGE_KEYWORDS[m.group(0)] if m else None
+
+
+def looks_like_switch(normalized: str) -> bool:
+    return _CUE_RE.search(normalized) is not None
+
+
+class IntentDetector:
+    """Per-session front end to the shared cache; `llm` is the small intent model."""
+    def __init__(self, llm) -> None:
+        self.llm = llm
+
+    def detect_local(self, text: str) -> tuple[bool, str | None]:
+        """
+        Cache, keyword and pre-filter stages only.
+        Returns (decided, code); decided=False means only the LLM can tell.
+        """
+        key = normalize(text)
+        if not key:
+            return True, None
+
+        cached = _cache.get(key)
+        if cached is not DecisionCache._MISS:
+            COUNTERS["hits"] += 1
+            return True, cached
+        COUNTERS["misses"] += 1
+
+        code = match_keyword(key)
+        cue = looks_like_switch(key)
+        words = len(key.split())
+        # "Hindi please" / "switch to Hindi", but not "I speak Hindi at home but …"
+        if code and (words <= 2 or (cue and words <= KEYWORD_MAX_WORDS)):
+            COUNTERS["keyword"] += 1
+            logger.info(f"Keyword intent detected: {code}")
+        elif cue or code:
+            return False, None  # a cue, or a language named in a longer sentence: the LLM decides
+        else:
+            COUNTERS["prefiltered"] += 1
+            code = None
+
+        _cache.put(key, code)
+        return True, code
+
+    async def detect_remote(self, text: str) -> str | None:
+        """LLM stage for transcripts `detect_local` could not decide."""
+        key = normalize(text)
+        shared = await asyncio.to_thread(_shared.get, key)
+        if shared is not DecisionCache._MISS:
+            COUNTERS["shared_hits"] += 1
+            _cache.put(key, shared)
+            return shared
+
+        pending = _inflight.get(key)
+        if pending is None:
+            pending = _inflight[key] = asyncio.ensure_future(self._resolve(key, text))
+            pending.add_done_callback(lambda _: _inflight.pop(key, None))
+        else:
+            COUNTERS["merged"] += 1
+        # shielded: one caller hanging up must not cancel the others' answer
+        code = await asyncio.shield(pending)
+        if code is _FAILED:
+            return None  # don't cache transient failures
+        _cache.put(key, code)
+        return code
+
+    async def _resolve(self, key: str, text: str):
+        """Ask the LLM if no other process is already asking; else wait for
+        its answer in the shared cache (or for its claim to lapse)."""
+        waited = False
+        while not await asyncio.to_thread(_shared.claim, key):
+            if not waited:
+                COUNTERS["shared_merged"] += 1
+                waited = True
+            await asyncio.sleep(CLAIM_POLL)
+            shared = await asyncio.to_thread(_shared.get, key)
+            if shared is not DecisionCache._MISS:
+                return shared
+        try:
+            code = await self._ask_llm(text)
+        except BaseException:
+            await asyncio.to_thread(_shared.release, key)
+            raise
+        if code is _FAILED:
+            await asyncio.to_thread(_shared.release, key)
+        else:
+            await asyncio.to_thread(_shared.put, key, code)
+        return code
+
+    async def detect(self, text: str) -> str | None:
+        decided, code = self.detect_local(text)
+        if decided:
+            return code
+        return await self.detect_remote(text)
+
+    async def _ask_llm(self, text: str):
+        # imported here: normalize() is shared with the training scripts, which run without livekit
+        from livekit.agents import llm
+
+        prompt = (
+            "Return ONLY one of these codes: en, es, fr, de, it, hi.\n"
+            f'User: "{text.strip()}"\n'
+            "If they want to switch the listening language, reply with that "
+            "code. Otherwise reply with none."
+        )
+        ctx = llm.ChatContext()
+        ctx.add_message(role="user", content=prompt)
+        parts = []
+        COUNTERS["llm_calls"] += 1
+        try:
+            async with groq_scheduler.slot(self.llm, groq_scheduler.INTENT, tokens=len(prompt) // 4 + 2), \
+                    self.llm.chat(chat_ctx=ctx) as stream:
+                async for chunk in stream:
+                    if chunk.delta and chunk.delta.content:
+                        parts.append(chunk.delta.content)
+                    if len("".join(parts)) > 8:
+                        break  # a code or "none"; the rest is chatter
+        except groq_scheduler.Shed as e:
+            COUNTERS["shed"] += 1
+            logger.info(f"Intent check skipped: {e}")
+            return _FAILED
+        except Exception as e:
+            COUNTERS["llm_errors"] += 1
+            logger.warning(f"Intent LLM failed: {e}")
+            return _FAILED
+        code = "".join(parts).strip().lower().strip(".\"'")
+        if code in LANGUAGE_NAMES:
+            logger.info(f"LLM intent detected language switch to {code}")
+            return code
+        return None
+
@@ -0,0 +1,221 @@
+"""
+language_agent.py – behaviour shared by every LokSwasthya agent variant
+(voice.py, voice_agent.py, ollama.py differ only in providers and instructions)
+"""
+import os
+import time
+import uuid
+import asyncio
+import logging
+
+from livekit.agents import StopResponse
+from livekit.agents.voice import Agent
+
+import admission
+import audio_gate
+import canned
+import context_window
+import groq_scheduler
+import health_report
+import intent
+import metrics
+import report_store
+import triage
+import worker_status
+import tts_cache
+from intent import LANGUAGE_NAMES
+from prewarm import Providers
+
+logger = logging.getLogger("stt-intent")
+
+# Start the reply while the intent LLM is still deciding (costs tokens when
+# the turn turns out to be a language switch; see intent.stats()).
+SPECULATIVE_INTENT = os.getenv("SPECULATIVE_INTENT", "0").lower() in ("1", "true", "yes")
+
+WELCOME = "Hi! I'm LokSwasthya. Please tell me your name and phone number to begin your health check."
+HOLD = "Hi! All our lines are busy right now. Please stay on the call, I'll be with you in a moment."
+
+# ── Language tables ──────────────────────────────────────────────────
+DEEPGRAM_CODES = {c: c for c in LANGUAGE_NAMES}  # 1‑to‑1 mapping
+GREETINGS = {
+    "en": "Listening in English now.",
+    "es": "¡Escuchando en español!",
+    "fr": "J'écoute maintenant en français.",
+    "de": "Ich höre jetzt Deutsch.",
+    "it": "Ora ascolto in italiano.",
+    "hi": "अब मैं हिंदी में सुन रहा हूँ।",
+}
+
+# Phrases whose audio never changes; served from tts_cache after the first call
+FIXED_PHRASES = [WELCOME, HOLD, *GREETINGS.values(), *triage.EMERGENCY_MESSAGES.values()]
+
+
+# ── Agent base class ──────────────────────────────────────────────────
+class LanguageSwitcherBase(Agent):
+    """
+    Replies in English, but flips STT language when the user asks for it
+    ('switch to Spanish'). Subclasses only supply instructions.
+    """
+    def __init__(self, providers: Providers, instructions: str, session_id: str | None = None) -> None:
+        super().__init__(
+            instructions=instructions,
+            stt=providers.stt,
+            tts=providers.tts,
+            llm=providers.llm,
+            vad=providers.vad,
+        )
+
+        self.tts_key = providers.tts_key
+        self.intent_llm = providers.intent_llm
+        self.intent = intent.IntentDetector(self.intent_llm)
+        # the small helper model also writes the rolling call notes
+        self.context = context_window.RollingContext(self.intent_llm)
+        self.current_lang = "en"
+        # filled in turn by turn; stored when the call ends (see health_report.py)
+        self.report = health_report.ReportBuilder(session_id or uuid.uuid4().hex)
+        # only speech (plus padding) is streamed to the STT; see audio_gate.py
+        self.gate = audio_gate.SpeechGate()
+        # Groq class of the next LLM reply (see groq_scheduler.py)
+        self.reply_priority = groq_scheduler.FIRST_TURN
+        self._replied = False
+        self._speculation: asyncio.Task | None = None
+
+    # Initial greeting
+    async def on_enter(self):
+        metrics.attach(self.session, self.llm, self.tts)
+        self.session.on("conversation_item_added", self._on_item_added)
+        self.session.on("user_state_changed", lambda ev: self.gate.set_speaking(ev.new_state == "speaking"))
+        admission.start_monitor()
+        # dispatched just before the worker reported itself full
+        if await admission.over_capacity():
+            await self._say_fixed(HOLD)
+            await admission.wait_for_capacity()
+        await self._say_fixed(WELCOME)
+
+    async def on_exit(self):
+        logger.info(f"Intent stats: {intent.stats()}")
+        worker_status.publish("intent", intent.stats())
+        metrics.publish()
+        logger.info(f"STT audio gate: {self.gate.finish()}")
+        store = report_store.get_store()
+        store.submit(self.report.build())
+        await asyncio.to_thread(store.flush)
+
+    # Every finished user turn arrives here, before the session replies
+    async def on_user_turn_completed(self, turn_ctx, new_message):
+        """Handle the turn locally where possible; otherwise let the session
+        run the normal pipeline → llm_node → TTS."""
+        text = new_message.text_content or ""
+        if not text.strip():
+            return
+        self.report.observe_user(text)
+        emergency = self._triage(text)
+        self.reply_priority = (
+            groq_scheduler.EMERGENCY if emergency
+            else groq_scheduler.REPLY if self._replied
+            else groq_scheduler.FIRST_TURN
+        )
+
+        t0 = time.perf_counter()
+        decided, target_code = self.intent.detect_local(text)
+        if not decided and SPECULATIVE_INTENT:
+            # the reply below starts right away; a detected switch interrupts it
+            self._start_speculative_intent(text)
+        else:
+            if not decided:
+                target_code = await self.intent.detect_remote(text)
+            metrics.observe(
+                metrics.STAGE_METRIC, time.perf_counter() - t0,
+                stage="intent", provider="local" if decided else metrics.provider_name(self.intent_llm),
+            )
+            if target_code and target_code != self.current_lang:
+                self._apply_stt_language(target_code)
+                raise StopResponse()  # do NOT forward the phrase to Llama
+
+        # The report is already assembled locally; read it out, no generation.
+        # Scripted turns (greetings, name/phone, thanks) never reach the LLM.
+        if health_report.is_report_request(text):
+            reply = self.report.spoken_summary()
+        else:
+            intake_done = bool(self.report.name and self.report.phone)
+            reply = None if emergency else canned.answer(text, intake_done)
+        if reply:
+            await self._remember(new_message)
+            self.session.say(reply)
+            raise StopResponse()
+
+        # Otherwise returning lets the session reply: llm_node → Llama3 → TTS
+
+    # Silence never leaves the worker; the VAD decides what the STT hears
+    async def stt_node(self, audio, model_settings):
+        if audio_gate.ENABLED:
+            audio = self.gate.filter(audio)
+        async for event in Agent.default.stt_node(self, audio, model_settings):
+            yield event
+
+    # Bounded prompt: system + call notes + last K turns (see context_window.py)
+    async def llm_node(self, chat_ctx, tools, model_settings):
+        # the reply runs in its own task, so this only tags this reply's Groq calls
+        groq_scheduler.PRIORITY.set(self.reply_priority)
+        self._replied = True
+        async for chunk in Agent.default.llm_node(self, self.context.view(chat_ctx), tools, model_settings):
+            yield chunk
+
+    # ---------- helper methods ---------------------------------------
+    def _start_speculative_intent(self, text: str):
+        """
+        Run the intent LLM next to the reply the session is about to start.
+        A detected switch interrupts the reply (and its queued TTS) instead
+        of delaying every turn.
+        """
+        intent.COUNTERS["speculative"] += 1
+        self._speculation = asyncio.create_task(self._speculative_intent(text))
+
+    async def _speculative_intent(self, text: str):
+        t0 = time.perf_counter()
+        target_code = await self.intent.detect_remote(text)
+        metrics.observe(
+            metrics.STAGE_METRIC, time.perf_counter() - t0,
+            stage="intent", provider=metrics.provider_name(self.intent_llm),
+        )
+        if target_code and target_code != self.current_lang:
+            intent.COUNTERS["speculative_wasted"] += 1
+            self.session.interrupt()
+            self._apply_stt_language(target_code)
+
+    async def _remember(self, new_message):
+        """StopResponse also drops the user line; keep it in the history the
+        LLM sees on later turns (the local reply is added by session.say)."""
+        chat_ctx = self.chat_ctx.copy()
+        chat_ctx.items.append(new_message)
+        await self.update_chat_ctx(chat_ctx)
+
+    def _on_item_added(self, ev):
+        item = ev.item
+        if getattr(item, "role", None) == "assistant" and item.text_content:
+            self.report.observe_assistant(item.text_content)
+
+    def _triage(self, text: str) -> bool:
+        """Red-flag check; on an emergency the cached warning is queued at once
+        and the LLM's detailed reply plays after it."""
+        t0 = time.perf_counter()
+        emergency, score, lang = triage.check(text)
+        metrics.observe(metrics.STAGE_METRIC, time.perf_counter() - t0, stage="triage", provider="local")
+        if not emergency:
+            return False
+        logger.warning(f"Emergency detected (score {score:.2f}): {text}")
+        self.report.flag_emergency(text.strip())
+        message = triage.EMERGENCY_MESSAGES[lang or self.current_lang]
+        tts_cache.speak(self.session, self.tts, self.tts_key, message)
+        return True
+
+    async def _say_fixed(self, text: str):
+        await tts_cache.say(self.session, self.tts, self.tts_key, text)
+
+    def _apply_stt_language(self, code: str):
+        """Flip Deepgram STT and greet (queued, not awaited)."""
+        self.stt.update_options(language=DEEPGRAM_CODES[code])
+        self.current_lang = code
+        self.report.language = code
+        tts_cache.speak(self.session, self.tts, self.tts_key, GREETINGS[code])
+        logger.info(f"STT language switched to {code}")
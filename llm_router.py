@@ -0,0 +1,245 @@
+"""
+llm_router.py – one LLM front end for every agent variant
+• Sends each chat to the primary backend (Groq or local Ollama)
+• If no token arrives within LLM_HEDGE_AFTER_MS, fires the same chat at the
+  secondary; whichever stream starts first wins, the other is cancelled
+• A backend that keeps failing trips a circuit breaker and is skipped
+  until its cooldown expires
+• Groq calls wait for a slot from groq_scheduler first; while one waits the
+  hedge timer is already running, so a rate-limited primary hands over
+Env:
+    LLM_PRIMARY=groq  LLM_SECONDARY=ollama  LLM_HEDGE_AFTER_MS=700
+    LLM_BREAKER_FAILURES=3  LLM_BREAKER_COOLDOWN_S=30
+    OLLAMA_BASE_URL=http://127.0.0.1:11434/v1  OLLAMA_MODEL=health-assistantv3
+"""
+import os
+import time
+import asyncio
+import logging
+import importlib
+from collections import Counter
+
+from livekit.agents import APIConnectionError, llm
+from livekit.agents.types import DEFAULT_API_CONNECT_OPTIONS, APIConnectOptions
+
+import admission
+import context_window
+import groq_scheduler
+import metrics
+import worker_status
+
+logger = logging.getLogger("llm-router")
+
+HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER_MS", "700")) / 1000
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434/v1")
+REPLY_TOKENS = 150  # completion budget reserved per reply (replies run 60-80 tokens)
+
+# Process-wide counters: requests, hedges, wins_<backend>, failures_<backend>, trips_<backend>
+COUNTERS: Counter = Counter()
+
+
+# ── Backends ──────────────────────────────────────────────────────────
+def _plugin(name: str):
+    """Plugins are imported on first use, so a worker only loads the backends
+    it is configured for. build_llm runs from prewarm on the job process's
+    main thread, where LiveKit requires plugins to register."""
+    return importlib.import_module(f"livekit.plugins.{name}")
+
+
+def build_llm(name: str, intent: bool = False):
+    """The plugin client for one backend; `intent` picks the small helper model."""
+    if name == "groq":
+        return _plugin("groq").LLM(
+            model=os.getenv("GROQ_INTENT_MODEL", "llama-3.2-11b-text-preview") if intent
+            else os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile"),
+            api_key=os.getenv("GROQ_API_KEY"),
+        )
+    if name == "ollama":
+        return _plugin("openai").LLM.with_ollama(
+            model=os.getenv("OLLAMA_INTENT_MODEL", "llama3.2") if intent
+            else os.getenv("OLLAMA_MODEL", "health-assistantv3"),
+            base_url=OLLAMA_BASE_URL,
+        )
+    raise ValueError(f"unknown LLM backend: {name!r}")
+
+
+class Backend:
+    """A plugin LLM plus its circuit-breaker state."""
+    def __init__(self, name: str, client) -> None:
+        self.name = name
+        self.llm = client
+        self.failures = 0
+        self.open_until = 0.0
+
+    def available(self) -> bool:
+        # after the cooldown one request is let through (half-open)
+        return time.monotonic() >= self.open_until
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self, err: Exception) -> None:
+        self.failures += 1
+        COUNTERS[f"failures_{self.name}"] += 1
+        logger.warning(f"LLM backend {self.name} failed ({self.failures}x): {err}")
+        if self.failures >= BREAKER_FAILURES:
+            self.open_until = time.monotonic() + BREAKER_COOLDOWN
+            COUNTERS[f"trips_{self.name}"] += 1
+            logger.error(f"Circuit open for {self.name} for {BREAKER_COOLDOWN:.0f} s")
+
+
+# ── Router ────────────────────────────────────────────────────────────
+class RouterLLM(llm.LLM):
+    def __init__(self, backends: list[Backend], hedge_after: float = HEDGE_AFTER) -> None:
+        super().__init__()
+        self.backends = backends
+        self.hedge_after = hedge_after
+
+    @classmethod
+    def from_env(cls, default_primary: str = "groq") -> "RouterLLM":
+        primary = os.getenv("LLM_PRIMARY", default_primary)
+        secondary = os.getenv("LLM_SECONDARY", "")
+        names = [primary, secondary] if secondary and secondary != primary else [primary]
+        return cls([Backend(n, build_llm(n)) for n in names])
+
+    @property
+    def model(self) -> str:
+        return self.backends[0].llm.model
+
+    @property
+    def provider_label(self) -> str:
+        return "+".join(b.name for b in self.backends)
+
+    def ollama_models(self) -> list[str]:
+        """Local models this router (and the matching intent LLM) will call."""
+        models = [b.llm.model for b in self.backends if b.name == "ollama"]
+        if self.backends[0].name == "ollama":
+            models.append(os.getenv("OLLAMA_INTENT_MODEL", "llama3.2"))
+        return models
+
+    def candidates(self) -> list[Backend]:
+        healthy = [b for b in self.backends if b.available()]
+        # everything tripped: still try the primary rather than go silent
+        return healthy or self.backends[:1]
+
+    def chat(self, *, chat_ctx, tools=None, conn_options=DEFAULT_API_CONNECT_OPTIONS, **kwargs) -> "HedgedStream":
+        return HedgedStream(
+            self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options, kwargs=kwargs
+        )
+
+
+_DONE = object()
+
+
+class _Attempt:
+    """One backend's stream, pumped into a queue; `first` resolves on the first chunk."""
+    def __init__(self, backend: Backend, chat_ctx, tools, kwargs) -> None:
+        self.backend = backend
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.first: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.started = time.perf_counter()
+        self.task = asyncio.create_task(self._pump(chat_ctx, tools, kwargs))
+
+    async def _pump(self, chat_ctx, tools, kwargs) -> None:
+        try:
+            with admission.track():
+                await self._stream(chat_ctx, tools, kwargs)
+        except Exception as e:
+            if not self.first.done():
+                self.first.set_exception(e)
+            else:
+                self.queue.put_nowait(e)
+
+    async def _stream(self, chat_ctx, tools, kwargs) -> None:
+        tokens = REPLY_TOKENS + sum(
+            context_window.estimate_tokens(context_window.item_text(i)) for i in chat_ctx.items
+        )
+        async with groq_scheduler.slot(self.backend.llm, tokens=tokens), \
+                self.backend.llm.chat(chat_ctx=chat_ctx, tools=tools, **kwargs) as stream:
+            async for chunk in stream:
+                if not self.first.done():
+                    self.first.set_result(time.perf_counter() - self.started)
+                self.queue.put_nowait(chunk)
+        if not self.first.done():
+            self.first.set_result(time.perf_counter() - self.started)
+        self.queue.put_nowait(_DONE)
+
+    def cancel(self) -> None:
+        self.task.cancel()
+        if not self.first.done():
+            self.first.cancel()
+
+
+class HedgedStream(llm.LLMStream):
+    def __init__(self, router: RouterLLM, *, chat_ctx, tools, conn_options, kwargs) -> None:
+        super().__init__(router, chat_ctx=chat_ctx, tools=tools, conn_options=conn_options)
+        self._router = router
+        # The router is the retry: a failing backend hands over to the next
+        # one at once instead of retrying itself first.
+        backend_options = APIConnectOptions(
+            max_retry=0, retry_interval=conn_options.retry_interval, timeout=conn_options.timeout
+        )
+        self._kwargs = {**kwargs, "conn_options": backend_options}
+
+    async def _run(self) -> None:
+        COUNTERS["requests"] += 1
+        waiting = list(self._router.candidates())
+        attempts: list[_Attempt] = []
+        winner: _Attempt | None = None
+        try:
+            attempts.append(self._start(waiting.pop(0)))
+            while winner is None:
+                live = [a for a in attempts if not a.first.done() or a.first.exception() is None]
+                if not live:
+                    if not waiting:
+                        # every backend has had its chance; LLMStream must not rerun the hedge
+                        raise APIConnectionError("all LLM backends failed", retryable=False)
+                    attempts.append(self._start(waiting.pop(0)))
+                    continue
+
+                done, _ = await asyncio.wait(
+                    [a.first for a in live],
+                    timeout=self._router.hedge_after if waiting else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:  # primary is slow: hedge
+                    COUNTERS["hedges"] += 1
+                    attempts.append(self._start(waiting.pop(0)))
+                    continue
+
+                for a in live:
+                    if not a.first.done():
+                        continue
+                    if a.first.exception() is None:
+                        winner = a
+                        break
+                    a.backend.record_failure(a.first.exception())
+
+            for a in attempts:
+                if a is not winner:
+                    a.cancel()
+            COUNTERS[f"wins_{winner.backend.name}"] += 1
+            metrics.observe(
+                metrics.STAGE_METRIC, winner.first.result(),
+                stage="llm_ttft_backend", provider=winner.backend.name,
+            )
+
+            while True:
+                item = await winner.queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    winner.backend.record_failure(item)
+                    raise item
+                self._event_ch.send_nowait(item)
+            winner.backend.record_success()
+        finally:
+            for a in attempts:
+                a.cancel()
+            worker_status.publish("llm_router", dict(COUNTERS), min_interval=5.0)
+
+    def _start(self, backend: Backend) -> _Attempt:
+        return _Attempt(backend, self._chat_ctx, self._tools, self._kwargs)
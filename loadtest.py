@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+loadtest.py – offline capacity benchmark for the agent worker
+Runs N simulated callers through the real `entrypoint` and
+LanguageSwitcherAgent of an agent module, with fake_plugins standing in
+for Deepgram / Groq / ElevenLabs / Silero and for the LiveKit session.
+Replies go through the agent's llm_node, the context window and RouterLLM
+to fake backends. Greetings, name/phone and thanks come from the paste.txt
+corpus (the canned index answers those); symptoms and follow-ups need the
+LLM. No network access.
+Usage:
+    python loadtest.py --agent voice_agent --procs 2 --callers 50
+    python loadtest.py --llm-ttft 0.8 --failure-rate 0.02
+Reports sessions per core, per-stage latency percentiles, CPU and RSS.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import importlib
+import contextvars
+import multiprocessing as mp
+from types import SimpleNamespace
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Which simulated caller the entrypoint is currently building a session for
+_caller_id: contextvars.ContextVar[str] = contextvars.ContextVar("caller_id")
+
+
+# Turns no corpus entry answers: they always reach the LLM (the first also
+# the intent LLM, since "talk" is a switch cue)
+FOLLOW_UPS = [
+    "Can you talk me through what I should do tonight",
+    "It started about three days ago and is getting a little worse",
+    "Should I see a doctor or can I manage this at home",
+    "Is it safe to take paracetamol with that",
+    "What should I eat while I recover",
+]
+
+
+def load_script(path: str) -> list[list[str]]:
+    """Caller scripts: greeting, name/phone, a symptom, two follow-ups, thanks."""
+    greetings, intros, symptoms, closings = [], [], [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            prompt = json.loads(line)["prompt"]
+            user = prompt.split("User:")[-1].split("Assistant:")[0].strip()
+            if prompt.startswith("[Category"):
+                symptoms.append(user)
+            elif user.lower().startswith("my name is"):
+                intros.append(user)
+            elif user.lower().startswith(("thank", "can you", "i need my", "generate", "show")):
+                closings.append(user)
+            else:
+                greetings.append(user)
+    return [greetings, intros, symptoms, FOLLOW_UPS, FOLLOW_UPS, closings]
+
+
+async def _caller(module, fake, proc, script, cfg, caller_id: str, sessions: dict) -> float | None:
+    """Run one call; returns its duration, or None if any provider call failed."""
+    t0 = time.perf_counter()
+    _caller_id.set(caller_id)
+    ctx = fake.FakeJobContext(caller_id, proc)
+    await module.entrypoint(ctx)
+    session = sessions.pop(caller_id)
+    try:
+        for options in script:
+            if not options:
+                continue
+            text = random.choice(options)
+            await asyncio.sleep(len(text.split()) * 0.3 * cfg.time_scale)  # caller speaking
+            session._state("user_state_changed", "speaking", "listening")
+            eou, stt = cfg.eou.sample(), cfg.stt.sample()
+            await asyncio.sleep(max(eou, stt))
+            session.emit("metrics_collected", SimpleNamespace(
+                metrics=fake.EOUMetrics(end_of_utterance_delay=eou, transcription_delay=stt)))
+            await session.user_turn(text)
+        return time.perf_counter() - t0 if session.errors == 0 else None
+    finally:
+        await session.aclose()
+        await ctx.shutdown()
+
+
+async def _run_callers(args, worker_index: int) -> dict:
+    import fake_plugins as fake
+    import metrics
+    import prewarm
+    from llm_router import Backend, RouterLLM
+
+    cfg = fake.FakeConfig(
+        llm_ttft=fake.Latency(args.llm_ttft, 0.5),
+        tts_ttfb=fake.Latency(args.tts_ttfb, 0.4),
+        tokens_per_s=args.tokens_per_s,
+        failure_rate=args.failure_rate,
+        time_scale=args.time_scale,
+    )
+    module = importlib.import_module(args.agent)
+    tts_key = ("fake", "fake-tts", "")
+
+    def _router():
+        backends = [Backend("fake", fake.FakeLLM(cfg))]
+        if args.hedge:
+            backends.append(Backend("fake-secondary", fake.FakeLLM(cfg, "fake-llm-2")))
+        return RouterLLM(backends)
+
+    module.build_providers = lambda: prewarm.Providers(
+        stt=fake.FakeSTT(cfg), tts=fake.FakeTTS(cfg), llm=_router(),
+        intent_llm=fake.FakeLLM(cfg, "fake-intent", intent=True), tts_key=tts_key,
+    )
+    sessions: dict = {}
+
+    def _session_factory(*a, **kw):
+        session = sessions[_caller_id.get()] = fake.SimSession()
+        return session
+
+    module.AgentSession = _session_factory
+    prewarm.silero = SimpleNamespace(VAD=fake.FakeVAD)
+
+    proc = SimpleNamespace(userdata={})
+    module.prewarm(proc)
+
+    script = load_script(args.corpus)
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        async with sem:
+            await asyncio.sleep(random.uniform(0, args.ramp))
+            return await _caller(module, fake, proc, script, cfg, f"w{worker_index}-c{i}", sessions)
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(args.callers)), return_exceptions=True)
+    wall = time.perf_counter() - t0
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    durations = [r for r in results if isinstance(r, float)]
+    return {
+        "ok": len(durations),
+        "failed": len(results) - len(durations),
+        "session_s": sum(durations),
+        "wall_s": wall,
+        "cpu_s": usage.ru_utime + usage.ru_stime,
+        "max_rss_mb": usage.ru_maxrss / 1024,
+        "metrics": metrics.snapshot(),
+    }
+
+
+def _worker(args, worker_index: int, out):
+    random.seed(args.seed + worker_index)
+    out.put(asyncio.run(_run_callers(args, worker_index)))
+
+
+def report(results: list[dict]) -> None:
+    import metrics
+
+    ok = sum(r["ok"] for r in results)
+    failed = sum(r["failed"] for r in results)
+    wall = max(r["wall_s"] for r in results)
+    cpu = sum(r["cpu_s"] for r in results)
+    cores_used = cpu / wall if wall else 0.0
+    print(f"sessions: {ok} ok, {failed} failed in {wall:.1f} s wall")
+    print(f"cpu: {cpu:.1f} s ({cores_used:.2f} cores busy)  "
+          f"max rss/proc: {max(r['max_rss_mb'] for r in results):.0f} MB")
+    if cores_used:
+        # average number of live calls, divided by the cores they kept busy
+        concurrent = sum(r["session_s"] for r in results) / wall
+        print(f"sessions per core: {concurrent / cores_used:.1f} "
+              f"(avg {concurrent:.1f} concurrent calls)")
+    print()
+    print(f"{'metric':<44}{'provider':<22}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}")
+    merged = metrics.merge([r["metrics"] for r in results])
+    for (name, labels), hist in sorted(merged.items()):
+        labels = dict(labels)
+        stage = labels.get("stage", "ttfa")
+        row = [metrics.quantile(hist, q) for q in (0.5, 0.95, 0.99)]
+        print(f"{name.replace('lokswasthya_', '') + ':' + stage:<44}{labels.get('provider', ''):<22}"
+              f"{hist.count:>6}" + "".join(f"{v * 1000:>7.0f}ms" for v in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agent", default="voice_agent", help="agent module to drive")
+    parser.add_argument("--procs", type=int, default=1, help="worker processes")
+    parser.add_argument("--callers", type=int, default=20, help="simulated callers per process")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent callers per process")
+    parser.add_argument("--ramp", type=float, default=1.0, help="spread call arrivals over N seconds")
+    parser.add_argument("--corpus", default=os.path.join(HERE, "paste.txt"))
+    parser.add_argument("--llm-ttft", type=float, default=0.35, help="median LLM time to first token (s)")
+    parser.add_argument("--tts-ttfb", type=float, default=0.2, help="median TTS first byte (s)")
+    parser.add_argument("--tokens-per-s", type=float, default=250.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="per provider call")
+    parser.add_argument("--hedge", action="store_true", help="give the router a second fake backend")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="playout/think time multiplier")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Keep status files and cached audio out of the real deployment paths
+    scratch = tempfile.mkdtemp(prefix="lokswasthya-loadtest-")
+    os.environ["LOKSWASTHYA_STATUS_DIR"] = os.path.join(scratch, "status")
+    os.environ["TTS_CACHE_DIR"] = os.path.join(scratch, "tts")
+    os.environ["REPORT_DB"] = os.path.join(scratch, "reports.db")
+    sys.path.insert(0, HERE)
+
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(args, i, out)) for i in range(args.procs)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
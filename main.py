@@ -1,40 +1,318 @@
 """
-main.py – Render Web Service entrypoint
+main.py – Render Web Service entrypoint
 • Serves /  →  health‑check JSON
-• Spawns `voice_agent.py` as a child process on startup
+• Spawns a pool of `voice_agent.py` worker processes on startup
+• Serves /workers, /healthz  →  per-worker status, load and real capacity
+• Serves /ready  →  200 only while a worker is registered with LiveKit and
+  has a prewarmed idle job process (the deploy health check)
+• Serves /canned  →  hit rate of the local canned-response index
+• Serves /metrics, /latency  →  pipeline latency histograms from every worker
+• Serves /reports  →  stored health reports (filter by phone / severity);
+  needs the ADMIN_TOKEN bearer token
 Run locally:
-    uvicorn main:app --reload        (agent will also start)
+    uvicorn main:app --reload        (agents will also start)
+Env:
+    AGENT_WORKERS        number of agent processes (default: CPU count)
+    AGENT_BACKOFF_BASE   first restart delay in seconds (default 0.5)
+    AGENT_BACKOFF_MAX    restart delay cap in seconds (default 30)
+    AGENT_IMPORT_PROFILE run workers under `python -X importtime` (stderr)
+    AGENT_DRAIN_TIMEOUT_S  how long a stopping worker may finish its calls (default 1800)
+    ADMIN_TOKEN          bearer token for /workers/restart and /reports; unset = disabled
 """
-import os, subprocess, threading, time, logging, signal
-from fastapi import FastAPI
+import os, subprocess, threading, time, logging, signal, random, hmac
+from fastapi import FastAPI, Header
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+import metrics
+import report_store
+import worker_status
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("lokswasthya-main")
 
-AGENT_CMD = ["python", "voice_agent.py", "dev"]
+AGENT_CMD = ["python", "voice_agent.py", os.getenv("AGENT_MODE", "dev")]
+if os.getenv("AGENT_IMPORT_PROFILE", "0").lower() in ("1", "true", "yes"):
+    AGENT_CMD[1:1] = ["-X", "importtime"]
  # <- match your filename
 
-def agent_supervisor():
+NUM_WORKERS = int(os.getenv("AGENT_WORKERS", str(os.cpu_count() or 1)))
+BACKOFF_BASE = float(os.getenv("AGENT_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("AGENT_BACKOFF_MAX", "30"))
+STABLE_AFTER = 60.0          # a run this long resets the backoff
+AGENT_BASE_PORT = 8081       # LiveKit worker HTTP port, one per process
+# SIGTERM grace before SIGKILL; LiveKit's own drain timeout, so calls finish
+DRAIN_TIMEOUT = float(os.getenv("AGENT_DRAIN_TIMEOUT_S", "1800"))
+READY_TIMEOUT = 300.0        # a restarted worker must be ready within this
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+COMPACT_INTERVAL = 30.0      # fold status snapshots of exited job processes
+LOAD_THRESHOLD = float(os.getenv("AGENT_LOAD_THRESHOLD", "0.8"))  # same env the workers read
+
+
+# ── Worker pool ───────────────────────────────────────────────────────
+class WorkerSlot:
+    """One supervised agent process and its restart bookkeeping."""
+    def __init__(self, index: int) -> None:
+        self.index = index
+        self.proc: subprocess.Popen | None = None
+        self.started_at: float | None = None
+        self.restarts = 0
+        self.failures = 0            # consecutive short-lived runs
+        self.last_exit_code: int | None = None
+        self.restart_requested = threading.Event()
+
+    @property
+    def worker_id(self) -> str:
+        return str(self.index)
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def status(self) -> dict:
+        alive = self.alive()
+        return {
+            "worker": self.index,
+            "pid": self.proc.pid if alive else None,
+            "alive": alive,
+            "uptime_s": round(time.time() - self.started_at, 1) if alive else 0.0,
+            "restarts": self.restarts,
+            "last_exit_code": self.last_exit_code,
+            "active_sessions": worker_status.active_sessions(self.worker_id) if alive else 0,
+            "load": (worker_status.collect("load", self.worker_id) or [None])[0] if alive else None,
+            **(worker_status.readiness(self.worker_id) if alive else {"ready": False, "stages": {}}),
+        }
+
+
+_slots = [WorkerSlot(i) for i in range(max(NUM_WORKERS, 1))]
+_stopping = threading.Event()
+_restart_lock = threading.Lock()
+
+
+def _backoff(failures: int) -> float:
+    """Full-jitter exponential backoff: first retry is near-instant."""
+    if failures <= 0:
+        return 0.0
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1)))
+
+
+def _stop(slot: WorkerSlot) -> None:
+    """SIGTERM lets the LiveKit worker drain its calls; SIGKILL after the grace period."""
+    if not slot.alive():
+        return
+    slot.proc.send_signal(signal.SIGTERM)
+    _wait_or_kill(slot)
+
+
+def _wait_or_kill(slot: WorkerSlot) -> None:
+    try:
+        slot.proc.wait(timeout=DRAIN_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        logger.warning("Worker %d did not drain in %.0f s, killing", slot.index, DRAIN_TIMEOUT)
+        slot.proc.kill()
+
+
+def agent_supervisor(slot: WorkerSlot):
     """
-    Launch the LiveKit agent as a child process.
-    If it ever exits, restart after 5 seconds.
+    Launch one LiveKit agent as a child process.
+    If it ever exits, restart it with jittered exponential backoff.
     """
-    while True:
-        logger.info("Starting LiveKit agent subprocess …")
-        proc = subprocess.Popen(AGENT_CMD, env=os.environ.copy())
-        exit_code = proc.wait()
-        logger.warning("Agent exited (code=%s). Restarting in 5 s …", exit_code)
-        time.sleep(5)
+    while not _stopping.is_set():
+        worker_status.reset_worker(slot.worker_id)
+        env = os.environ.copy()
+        env["LOKSWASTHYA_WORKER_ID"] = slot.worker_id
+        env["AGENT_HTTP_PORT"] = str(AGENT_BASE_PORT + slot.index)
+
+        logger.info("Starting LiveKit agent worker %d …", slot.index)
+        slot.proc = subprocess.Popen(AGENT_CMD, env=env)
+        slot.started_at = time.time()
+        slot.last_exit_code = slot.proc.wait()
+        if _stopping.is_set():
+            break
+
+        ran_for = time.time() - slot.started_at
+        if slot.restart_requested.is_set():
+            slot.restart_requested.clear()
+            slot.failures = 0
+        elif ran_for >= STABLE_AFTER:
+            slot.failures = 1
+        else:
+            slot.failures += 1
+        slot.restarts += 1
+
+        delay = _backoff(slot.failures)
+        logger.warning(
+            "Agent worker %d exited (code=%s) after %.0f s. Restarting in %.1f s …",
+            slot.index, slot.last_exit_code, ran_for, delay,
+        )
+        _stopping.wait(delay)
+
+
+def rolling_restart():
+    """Restart workers one at a time, waiting for each to come back first."""
+    with _restart_lock:
+        for slot in _slots:
+            if _stopping.is_set():
+                return
+            old_pid = slot.proc.pid if slot.alive() else None
+            slot.restart_requested.set()
+            _stop(slot)
+            deadline = time.monotonic() + READY_TIMEOUT
+            # the old worker's markers are wiped before the new one starts
+            while not _stopping.is_set():
+                if (slot.alive() and slot.proc.pid != old_pid
+                        and worker_status.readiness(slot.worker_id)["ready"]):
+                    break
+                if time.monotonic() > deadline:
+                    logger.error("Worker %d not ready after %.0f s; stopping the rolling restart",
+                                 slot.index, READY_TIMEOUT)
+                    return
+                time.sleep(0.5)
+            logger.info("Worker %d restarted and ready (pid=%s)", slot.index, slot.proc.pid)
+
 
 # ── FastAPI app (Render listens on this) ──────────────────────────────
 app = FastAPI()
 
+
+def _authorized(authorization: str | None) -> bool:
+    """Admin routes need `Authorization: Bearer $ADMIN_TOKEN`; no token, no access."""
+    if not ADMIN_TOKEN or not authorization:
+        return False
+    scheme, _, token = authorization.partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip(), ADMIN_TOKEN)
+
+
+_FORBIDDEN = {"error": "admin token required"}
+
 @app.get("/")
 def health():
     return {"status": "LokSwasthya web service running."}
 
+@app.get("/workers")
+def workers():
+    return {"workers": [slot.status() for slot in _slots]}
+
+@app.get("/workers/{index}")
+def worker(index: int):
+    if not 0 <= index < len(_slots):
+        return JSONResponse({"error": "unknown worker"}, status_code=404)
+    return _slots[index].status()
+
+@app.post("/workers/restart")
+def restart_workers(authorization: str | None = Header(default=None)):
+    if not _authorized(authorization):
+        return JSONResponse(_FORBIDDEN, status_code=403)
+    if _restart_lock.locked():
+        return JSONResponse({"status": "rolling restart already running"}, status_code=409)
+    threading.Thread(target=rolling_restart, daemon=True).start()
+    return {"status": "rolling restart started"}
+
+@app.get("/canned")
+def canned_stats():
+    totals = worker_status.collect_counters("canned")
+    hits = totals.get("exact", 0) + totals.get("fuzzy", 0)
+    lookups = hits + totals.get("misses", 0)
+    return {
+        "lookups": lookups,
+        "exact": totals.get("exact", 0),
+        "fuzzy": totals.get("fuzzy", 0),
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    merged = metrics.merge(worker_status.collect("metrics"))
+    counters = {
+        "lokswasthya_intent_total": worker_status.collect_counters("intent"),
+        "lokswasthya_canned_total": worker_status.collect_counters("canned"),
+        "lokswasthya_triage_total": worker_status.collect_counters("triage"),
+        "lokswasthya_stt_gate_total": worker_status.collect_counters("audio_gate"),
+        "lokswasthya_admission_total": worker_status.collect_counters("admission"),
+        "lokswasthya_llm_router_total": worker_status.collect_counters("llm_router"),
+        "lokswasthya_groq_scheduler_total": worker_status.collect_counters("groq_scheduler"),
+        "lokswasthya_ollama_residency_total": worker_status.collect_counters("ollama"),
+    }
+    return PlainTextResponse(metrics.render_prometheus(merged, counters))
+
+@app.get("/latency")
+def latency():
+    """p50/p95/p99 per stage and provider, estimated from the histogram buckets."""
+    merged = metrics.merge(worker_status.collect("metrics"))
+    rows = []
+    for (name, labels), hist in sorted(merged.items()):
+        rows.append({
+            "metric": name,
+            **dict(labels),
+            "count": hist.count,
+            **{f"p{int(q * 100)}": metrics.quantile(hist, q) for q in (0.5, 0.95, 0.99)},
+        })
+    return {"latency": rows}
+
+# Reports hold names, phone numbers and symptoms: admin token only
+@app.get("/reports")
+def reports(phone: str | None = None, severity: str | None = None, limit: int = 50,
+            authorization: str | None = Header(default=None)):
+    if not _authorized(authorization):
+        return JSONResponse(_FORBIDDEN, status_code=403)
+    return {"reports": report_store.query(phone=phone, severity=severity, limit=min(limit, 500))}
+
+@app.get("/reports/{session_id}")
+def report(session_id: str, authorization: str | None = Header(default=None)):
+    if not _authorized(authorization):
+        return JSONResponse(_FORBIDDEN, status_code=403)
+    found = report_store.get(session_id)
+    if found is None:
+        return JSONResponse({"error": "unknown session"}, status_code=404)
+    return found
+
+@app.get("/healthz")
+def healthz():
+    statuses = [slot.status() for slot in _slots]
+    alive = sum(s["alive"] for s in statuses)
+    body = {
+        "workers_alive": alive,
+        "workers_total": len(statuses),
+        "active_sessions": sum(s["active_sessions"] for s in statuses),
+        "workers_accepting": sum(
+            s["alive"] and (s["load"] or {}).get("load", 0.0) < LOAD_THRESHOLD for s in statuses
+        ),
+    }
+    return JSONResponse(body, status_code=200 if alive else 503)
+
+@app.get("/ready")
+def ready():
+    """Readiness, unlike /healthz: a live process is not enough until it can take a call."""
+    statuses = [slot.status() for slot in _slots]
+    ready_workers = sum(s["ready"] for s in statuses)
+    body = {
+        "ready": ready_workers > 0,
+        "workers_ready": ready_workers,
+        "workers_total": len(statuses),
+        "startup": {s["worker"]: s["stages"] for s in statuses},
+    }
+    return JSONResponse(body, status_code=200 if ready_workers else 503)
+
+def status_compactor():
+    """Every call leaves its job process's snapshots behind; fold them away."""
+    while not _stopping.wait(COMPACT_INTERVAL):
+        removed = worker_status.compact()
+        if removed:
+            logger.debug("Folded %d snapshot(s) of finished job processes", removed)
+
+
 @app.on_event("startup")
 def launch_agent():
-    # Start supervisor in a daemon thread so it doesn't block FastAPI
-    threading.Thread(target=agent_supervisor, daemon=True).start()
-    logger.info("Agent supervisor thread launched")
+    # One supervisor thread per worker so none of them blocks FastAPI
+    for slot in _slots:
+        threading.Thread(target=agent_supervisor, args=(slot,), daemon=True).start()
+    threading.Thread(target=status_compactor, daemon=True).start()
+    logger.info("Agent supervisor launched %d worker(s)", len(_slots))
+
+@app.on_event("shutdown")
+def stop_agents():
+    _stopping.set()
+    for slot in _slots:
+        if slot.alive():
+            slot.proc.send_signal(signal.SIGTERM)
+    for slot in _slots:
+        if slot.proc is not None:
+            _wait_or_kill(slot)
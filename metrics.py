@@ -0,0 +1,174 @@
+"""
+metrics.py – per-turn latency histograms for the agent pipeline
+Agent side:  attach(session, ...) listens to AgentSession events and
+             `observe()`s stage timings; snapshots go through worker_status.
+main.py:     merge() + render_prometheus() serve every worker at /metrics.
+Stages (seconds):
+    eou_delay       end of user speech → end-of-utterance decision (VAD)
+    stt_delay       end of user speech → final transcript
+    intent          language-switch intent check
+    llm_ttft        LLM first token          llm_total   LLM last token
+    tts_ttfb        TTS first audio byte
+    time_to_first_audio   end of user speech → agent starts playing out
+"""
+import time
+import bisect
+import logging
+
+import worker_status
+
+logger = logging.getLogger("metrics")
+
+BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75,
+    1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0,
+)
+STAGE_METRIC = "lokswasthya_stage_seconds"
+TTFA_METRIC = "lokswasthya_time_to_first_audio_seconds"
+PUBLISH_INTERVAL = 5.0
+
+
+def provider_name(client) -> str:
+    """'groq' for livekit.plugins.groq.LLM, etc."""
+    label = getattr(client, "provider_label", None)
+    if label:
+        return label
+    parts = type(client).__module__.split(".")
+    return parts[2] if len(parts) > 2 and parts[1] == "plugins" else parts[0]
+
+
+# ── Histograms ────────────────────────────────────────────────────────
+class Histogram:
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+_histograms: dict[tuple, Histogram] = {}
+
+
+def observe(name: str, value: float, **labels) -> None:
+    key = (name, tuple(sorted(labels.items())))
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = _histograms[key] = Histogram()
+    hist.observe(value)
+    publish(min_interval=PUBLISH_INTERVAL)
+
+
+def snapshot(histograms: dict[tuple, "Histogram"] | None = None) -> dict:
+    histograms = _histograms if histograms is None else histograms
+    return {
+        "histograms": [
+            {"name": name, "labels": dict(labels), "counts": h.counts, "sum": h.sum, "count": h.count}
+            for (name, labels), h in histograms.items()
+        ]
+    }
+
+
+def publish(min_interval: float = 0.0) -> None:
+    worker_status.publish("metrics", snapshot(), min_interval=min_interval)
+
+
+# ── Session wiring ────────────────────────────────────────────────────
+def attach(session, llm, tts) -> None:
+    """Record stage timings for one AgentSession."""
+    llm_name, tts_name = provider_name(llm), provider_name(tts)
+    pair = f"{llm_name}+{tts_name}"
+    speech_end = None
+
+    @session.on("metrics_collected")
+    def _on_metrics(ev):
+        m = ev.metrics
+        kind = type(m).__name__
+        if kind == "EOUMetrics":
+            observe(STAGE_METRIC, m.end_of_utterance_delay, stage="eou_delay", provider="silero")
+            observe(STAGE_METRIC, m.transcription_delay, stage="stt_delay", provider="deepgram")
+        elif kind == "LLMMetrics":
+            observe(STAGE_METRIC, m.ttft, stage="llm_ttft", provider=llm_name)
+            observe(STAGE_METRIC, m.duration, stage="llm_total", provider=llm_name)
+        elif kind == "TTSMetrics":
+            observe(STAGE_METRIC, m.ttfb, stage="tts_ttfb", provider=tts_name)
+
+    @session.on("user_state_changed")
+    def _on_user_state(ev):
+        nonlocal speech_end
+        if ev.old_state == "speaking" and ev.new_state == "listening":
+            speech_end = time.perf_counter()
+
+    @session.on("agent_state_changed")
+    def _on_agent_state(ev):
+        nonlocal speech_end
+        if ev.new_state == "speaking" and speech_end is not None:
+            observe(TTFA_METRIC, time.perf_counter() - speech_end, provider=pair)
+            speech_end = None
+
+
+# ── main.py side ──────────────────────────────────────────────────────
+def merge(snapshots: list[dict]) -> dict[tuple, Histogram]:
+    merged: dict[tuple, Histogram] = {}
+    for snap in snapshots:
+        for h in snap.get("histograms", []):
+            key = (h["name"], tuple(sorted(h["labels"].items())))
+            acc = merged.setdefault(key, Histogram())
+            acc.counts = [a + b for a, b in zip(acc.counts, h["counts"])]
+            acc.sum += h["sum"]
+            acc.count += h["count"]
+    return merged
+
+
+def fold(total: dict, snap: dict) -> dict:
+    """worker_status.compact: add an exited process's snapshot to the total."""
+    return snapshot(merge([total, snap]))
+
+
+worker_status.FOLDS["metrics"] = fold
+
+
+def quantile(hist: Histogram, q: float) -> float | None:
+    """Bucket-interpolated estimate, same as Prometheus histogram_quantile."""
+    if hist.count == 0:
+        return None
+    rank = q * hist.count
+    seen = 0
+    for i, c in enumerate(hist.counts):
+        if seen + c >= rank and c:
+            lo = BUCKETS[i - 1] if i > 0 else 0.0
+            hi = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+            return lo + (hi - lo) * (rank - seen) / c
+        seen += c
+    return BUCKETS[-1]
+
+
+def _fmt_labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render_prometheus(merged: dict[tuple, Histogram], counters: dict[str, dict] = None) -> str:
+    lines = []
+    for name in sorted({n for n, _ in merged}):
+        lines.append(f"# TYPE {name} histogram")
+        for (n, labels), h in sorted(merged.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for le, c in zip((*BUCKETS, "+Inf"), h.counts):
+                cumulative += c
+                le_label = f'le="{le}"'
+                lines.append(f"{name}_bucket{_fmt_labels(labels, le_label)} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {h.sum}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {h.count}")
+    for name, values in (counters or {}).items():
+        lines.append(f"# TYPE {name} counter")
+        for result, value in sorted(values.items()):
+            lines.append(f'{name}{{result="{result}"}} {value}')
+    return "\n".join(lines) + "\n"
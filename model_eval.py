@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+model_eval.py – replay held-out paste.txt dialogues against Ollama models
+• Concurrent asyncio client for the streaming /api/chat endpoint
+• Per request: time to first token, tokens/s, total latency, reply length
+  against the 60-80 token budget from the Modelfile system prompt
+• One JSON report per model tag, plus a side-by-side table
+• --stub serves a fake /api/chat locally, so the runner can be exercised
+  without Ollama or a GPU
+Usage:
+    python model_eval.py health-assistantv3 llama3.2 --concurrency 8
+    python model_eval.py health-assistantv3 --stub
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+
+import aiohttp
+from aiohttp import web
+
+from fine import HOLDOUT_EVERY, TRAINING_SYSTEM, _read_records, convert_record, is_holdout
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OLLAMA_API = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434/v1").rstrip("/").removesuffix("/v1")
+TOKEN_BUDGET = 80
+
+
+# ── Held-out set ──────────────────────────────────────────────────────
+def load_holdout(path: str, every: int = HOLDOUT_EVERY, limit: int | None = None) -> list[dict]:
+    """A stable slice of the corpus, picked by content hash (not file position)."""
+    cases = []
+    for _, record_id, raw in _read_records(path):
+        if not is_holdout(record_id, every):
+            continue
+        converted = convert_record(record_id, raw)
+        if not isinstance(converted, str):
+            continue
+        user, reference = (m["content"] for m in json.loads(converted)["messages"])
+        cases.append({"id": record_id, "user": user, "reference": reference})
+        if limit and len(cases) >= limit:
+            break
+    return cases
+
+
+# ── Runner ────────────────────────────────────────────────────────────
+async def run_case(http: aiohttp.ClientSession, base_url: str, model: str, case: dict,
+                   system: str | None, timeout: float) -> dict:
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": case["user"]})
+    result = {"id": case["id"], "ok": False}
+    t0 = time.perf_counter()
+    first = None
+    chunks, text, data = 0, [], {}
+    try:
+        async with http.post(
+            f"{base_url}/api/chat",
+            json={"model": model, "messages": messages, "stream": True},
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.content:
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                content = data.get("message", {}).get("content", "")
+                if content:
+                    chunks += 1
+                    text.append(content)
+                    if first is None:
+                        first = time.perf_counter() - t0
+                if data.get("done"):
+                    break
+    except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+        result["error"] = str(e) or type(e).__name__
+        return result
+
+    total = time.perf_counter() - t0
+    # Ollama reports exact counts in the final line; fall back to chunk counts
+    tokens = data.get("eval_count", chunks)
+    gen_s = data.get("eval_duration", 0) / 1e9 or max(total - (first or 0), 1e-6)
+    result.update({
+        "ok": True,
+        "ttft_s": first if first is not None else total,
+        "latency_s": total,
+        "tokens": tokens,
+        "tokens_per_s": tokens / gen_s,
+        "over_budget": tokens > TOKEN_BUDGET,
+        "reply": "".join(text),
+    })
+    return result
+
+
+async def evaluate(model: str, cases: list[dict], base_url: str = OLLAMA_API, concurrency: int = 4,
+                   system: str | None = None, timeout: float = 120) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector) as http:
+        async def one(case):
+            async with sem:
+                return await run_case(http, base_url, model, case, system, timeout)
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(c) for c in cases))
+        wall = time.perf_counter() - t0
+    return {"model": model, "concurrency": concurrency, "wall_s": wall,
+            "summary": summarize(results, wall), "results": results}
+
+
+# ── Reporting ─────────────────────────────────────────────────────────
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def summarize(results: list[dict], wall: float) -> dict:
+    ok = [r for r in results if r["ok"]]
+    col = lambda key: [r[key] for r in ok]
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "ttft_p50_s": _percentile(col("ttft_s"), 0.5),
+        "ttft_p95_s": _percentile(col("ttft_s"), 0.95),
+        "latency_p50_s": _percentile(col("latency_s"), 0.5),
+        "latency_p95_s": _percentile(col("latency_s"), 0.95),
+        "tokens_per_s_p50": _percentile(col("tokens_per_s"), 0.5),
+        "tokens_mean": sum(col("tokens")) / len(ok) if ok else 0.0,
+        "over_budget_pct": 100.0 * sum(col("over_budget")) / len(ok) if ok else 0.0,
+        "throughput_rps": len(ok) / wall if wall else 0.0,
+    }
+
+
+def print_table(reports: list[dict]) -> None:
+    print(f"{'model':<28}{'n':>5}{'err':>5}{'ttft p50':>10}{'p95':>8}{'lat p50':>9}{'p95':>8}"
+          f"{'tok/s':>8}{'tokens':>8}{'>budget':>9}{'req/s':>7}")
+    for report in reports:
+        s = report["summary"]
+        print(f"{report['model']:<28}{s['requests']:>5}{s['errors']:>5}"
+              f"{s['ttft_p50_s']:>9.2f}s{s['ttft_p95_s']:>7.2f}s"
+              f"{s['latency_p50_s']:>8.2f}s{s['latency_p95_s']:>7.2f}s"
+              f"{s['tokens_per_s_p50']:>8.1f}{s['tokens_mean']:>8.1f}"
+              f"{s['over_budget_pct']:>8.1f}%{s['throughput_rps']:>7.2f}")
+
+
+def write_report(report: dict, out_dir: str) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"eval_{report['model'].replace(':', '_').replace('/', '_')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+
+# ── Stub server ───────────────────────────────────────────────────────
+async def start_stub(ttft: float = 0.15, tokens_per_s: float = 60.0, port: int = 0):
+    """A fake streaming /api/chat that echoes a canned reply at a set speed."""
+    words = ("This appears to be a mild symptom. Stay hydrated, rest well and "
+             "see a doctor if it does not improve in two days.").split()
+
+    async def chat(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await resp.prepare(request)
+        await asyncio.sleep(random.lognormvariate(0, 0.3) * ttft)
+        count = random.randint(len(words) // 2, len(words))
+        for word in words[:count]:
+            line = {"model": body["model"], "message": {"role": "assistant", "content": word + " "}, "done": False}
+            await resp.write((json.dumps(line) + "\n").encode())
+            await asyncio.sleep(1 / tokens_per_s)
+        final = {"model": body["model"], "message": {"role": "assistant", "content": ""}, "done": True,
+                 "eval_count": count, "eval_duration": int(count / tokens_per_s * 1e9)}
+        await resp.write((json.dumps(final) + "\n").encode())
+        await resp.write_eof()
+        return resp
+
+    app = web.Application()
+    app.router.add_post("/api/chat", chat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    host, bound = runner.addresses[0][:2]
+    return runner, f"http://{host}:{bound}"
+
+
+async def run(models: list[str], corpus: str = os.path.join(HERE, "paste.txt"), concurrency: int = 4,
+              limit: int | None = None, system: str | None = None, stub: bool = False,
+              out_dir: str = os.path.join(HERE, "eval_reports")) -> list[dict]:
+    cases = load_holdout(corpus, limit=limit)
+    runner, base_url = await start_stub() if stub else (None, OLLAMA_API)
+    reports = []
+    try:
+        for model in models:
+            print(f"🧪 {model}: {len(cases)} held-out dialogues at concurrency {concurrency}")
+            report = await evaluate(model, cases, base_url, concurrency, system)
+            print(f"   → {write_report(report, out_dir)}")
+            reports.append(report)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+    print_table(reports)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("models", nargs="+", help="Ollama model tags to compare")
+    parser.add_argument("--corpus", default=os.path.join(HERE, "paste.txt"))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=None, help="max held-out dialogues")
+    parser.add_argument("--with-system", action="store_true",
+                        help="send the training system prompt (for base models without one)")
+    parser.add_argument("--stub", action="store_true", help="run against a local fake /api/chat")
+    parser.add_argument("--out", default=os.path.join(HERE, "eval_reports"))
+    args = parser.parse_args()
+    asyncio.run(run(
+        args.models, args.corpus, args.concurrency, args.limit,
+        TRAINING_SYSTEM if args.with_system else None, args.stub, args.out,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+ollama_warmup.py – keep the local Ollama models loaded and their prompt prefix warm
+• At worker start: load each model with a long keep_alive and run the agent's
+  system prompt through it once (num_predict=1) so prompt caching applies
+• Then a background thread re-sends keep_alive every OLLAMA_PING_INTERVAL_S.
+  The agents chat through the OpenAI-compatible /v1 endpoint, which has no
+  keep_alive, so every chat resets the model's expiry to the server default
+  (5 min); the interval is capped below that. A model missing from /api/ps
+  was evicted anyway: it is counted as a cold load and re-primed. Setting
+  OLLAMA_KEEP_ALIVE on the Ollama server itself avoids the reset entirely.
+• One persistent, pooled requests.Session; one pinging process per worker
+"""
+import os
+import time
+import fcntl
+import logging
+import threading
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import worker_status
+
+logger = logging.getLogger("ollama-warmup")
+
+OLLAMA_API = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434/v1").rstrip("/").removesuffix("/v1")
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "24h")
+SERVER_DEFAULT_KEEP_ALIVE = 300.0  # what a /v1 chat leaves the expiry at
+PING_INTERVAL = min(float(os.getenv("OLLAMA_PING_INTERVAL_S", "120")), SERVER_DEFAULT_KEEP_ALIVE * 0.8)
+COLD_LOAD_S = 0.5  # a load_duration above this means the weights were not resident
+
+# Process-wide counters: cold_loads, evictions, primes, pings, ping_failures
+COUNTERS: Counter = Counter()
+
+
+def _session() -> requests.Session:
+    s = requests.Session()
+    s.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+    return s
+
+
+class OllamaResidency:
+    def __init__(self, models: list[str], system_prompt: str | None = None) -> None:
+        self.models = list(dict.fromkeys(models))
+        self.system_prompt = system_prompt
+        self.http = _session()
+
+    # ---------- Ollama calls -----------------------------------------
+    def _post(self, path: str, body: dict, timeout: float = 300) -> dict:
+        resp = self.http.post(f"{OLLAMA_API}{path}", json=body, timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def resident(self) -> set[str]:
+        resp = self.http.get(f"{OLLAMA_API}/api/ps", timeout=5)
+        resp.raise_for_status()
+        names = set()
+        for m in resp.json().get("models", []):
+            names.add(m.get("name", ""))
+            names.add(m.get("model", ""))
+        return names
+
+    def load(self, model: str, evicted: bool = False) -> None:
+        """Empty prompt = load only, or just reset the expiry of a resident model;
+        report how long the weights took."""
+        data = self._post("/api/generate", {"model": model, "prompt": "", "keep_alive": KEEP_ALIVE})
+        load_s = data.get("load_duration", 0) / 1e9
+        if evicted or load_s >= COLD_LOAD_S:
+            COUNTERS["cold_loads"] += 1
+            metrics.observe(metrics.STAGE_METRIC, load_s, stage="ollama_cold_load", provider=model)
+            logger.info(f"Cold-loaded {model} in {load_s:.1f} s")
+
+    def prime(self, model: str) -> None:
+        """Evaluate the system prompt once so later chats reuse its KV prefix."""
+        if not self.system_prompt:
+            return
+        self._post("/api/chat", {
+            "model": model,
+            "messages": [{"role": "system", "content": self.system_prompt},
+                         {"role": "user", "content": "Hi"}],
+            "stream": False,
+            "keep_alive": KEEP_ALIVE,
+            "options": {"num_predict": 1},
+        })
+        COUNTERS["primes"] += 1
+
+    # ---------- lifecycle --------------------------------------------
+    def warm(self) -> None:
+        for model in self.models:
+            try:
+                self.load(model)
+                self.prime(model)
+            except requests.RequestException as e:
+                logger.warning(f"Ollama warmup failed for {model}: {e}")
+
+    def _tick(self) -> None:
+        COUNTERS["pings"] += 1
+        try:
+            loaded = self.resident()
+        except requests.RequestException as e:
+            COUNTERS["ping_failures"] += 1
+            logger.warning(f"Ollama ping failed: {e}")
+            loaded = None
+        for model in self.models:
+            evicted = loaded is not None and model not in loaded and f"{model}:latest" not in loaded
+            if evicted:
+                COUNTERS["evictions"] += 1
+                logger.warning(f"{model} was unloaded, reloading")
+            try:
+                self.load(model, evicted)
+                if evicted:
+                    self.prime(model)
+            except requests.RequestException as e:
+                logger.warning(f"Ollama keep-alive failed for {model}: {e}")
+
+    def run(self) -> None:
+        self.warm()
+        while True:
+            worker_status.publish("ollama", dict(COUNTERS))
+            time.sleep(PING_INTERVAL)
+            self._tick()
+
+
+# ── Worker hook ───────────────────────────────────────────────────────
+_residency: OllamaResidency | None = None
+
+
+def _lead(residency: OllamaResidency) -> None:
+    """Wait to become this worker's pinger, then run. Job processes come and go,
+    so the others keep retrying the lock and take over when the holder exits."""
+    os.makedirs(worker_status.worker_dir(), exist_ok=True)
+    with open(os.path.join(worker_status.worker_dir(), "ollama.lock"), "w") as lock:
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                time.sleep(PING_INTERVAL)
+        logger.info(f"Ollama residency started for {', '.join(residency.models)}")
+        residency.run()
+
+
+def start(models: list[str], system_prompt: str | None = None) -> None:
+    global _residency
+    if _residency is not None or not models:
+        return
+    _residency = OllamaResidency(models, system_prompt)
+    threading.Thread(target=_lead, args=(_residency,), name="ollama-residency", daemon=True).start()
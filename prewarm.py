@@ -0,0 +1,85 @@
+"""
+prewarm.py – per-process warm-up shared by the LiveKit agent variants
+• Loads the Silero VAD once per job process (ONNX model load is the slow part)
+• Builds the session's provider clients ahead of time; LiveKit gives each
+  job process exactly one session, so one set per process is all it uses
+• Builds the canned-response index and triage model before the first call arrives
+• Loads and primes any local Ollama models the providers use
+Hook it up with:
+    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm, **idle_processes()))
+"""
+import os
+import sys
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from livekit.agents import JobProcess
+from livekit.plugins import silero
+
+import canned
+import triage
+import ollama_warmup
+import worker_status
+
+logger = logging.getLogger("prewarm")
+
+
+# ── Idle processes ────────────────────────────────────────────────────
+def idle_processes() -> dict:
+    """WorkerOptions kwargs for the number of prewarmed idle job processes.
+    AGENT_IDLE_PROCESSES wins when set; otherwise one in dev mode (LiveKit's
+    dev default is 0, and /ready waits for a prewarmed process) and LiveKit's
+    own default, one per CPU, in production."""
+    value = os.getenv("AGENT_IDLE_PROCESSES")
+    if value:
+        return {"num_idle_processes": int(value)}
+    if sys.argv[1:2] == ["dev"]:
+        return {"num_idle_processes": 1}
+    return {}
+
+
+# ── Provider set ──────────────────────────────────────────────────────
+@dataclass
+class Providers:
+    """One session's worth of STT / TTS / LLM clients plus the shared VAD."""
+    stt: Any
+    tts: Any
+    llm: Any
+    intent_llm: Any
+    vad: Any = None
+    tts_key: tuple = ()  # (provider, model, voice) for the TTS audio cache
+
+
+# ── Prewarm hooks ─────────────────────────────────────────────────────
+def prewarm_process(
+    proc: JobProcess, factory: Callable[[], Providers], instructions: str | None = None
+) -> None:
+    """Called from each agent module's `prewarm` with its own provider factory."""
+    t0 = time.perf_counter()
+    vad = proc.userdata["vad"] = silero.VAD.load()
+    providers = proc.userdata["providers"] = factory()
+    providers.vad = vad
+    canned.get_index()
+    triage.get_model()
+    # local Ollama models behind the LLM router, if any
+    ollama_warmup.start(getattr(providers.llm, "ollama_models", list)(), instructions)
+    elapsed = time.perf_counter() - t0
+    worker_status.mark_ready("prewarmed", seconds=round(elapsed, 3))
+    logger.info("Prewarmed VAD + provider clients in %.0f ms", elapsed * 1000)
+
+
+def take_providers(proc: JobProcess, factory: Callable[[], Providers]) -> tuple[Providers, bool]:
+    """The set built in prewarm, or a cold one if prewarm did not run (e.g. tests).
+    Returns (providers, was_prewarmed); the prewarmed set is handed out once."""
+    providers = proc.userdata.pop("providers", None)
+    if providers is not None:
+        return providers, True
+    vad = proc.userdata.get("vad")
+    if vad is None:
+        logger.warning("Process was not prewarmed; loading VAD on the call path")
+        vad = proc.userdata["vad"] = silero.VAD.load()
+    providers = factory()
+    providers.vad = vad
+    return providers, False
@@ -0,0 +1,147 @@
+"""
+report_store.py – persist finished health reports to a local SQLite file
+• WAL mode, so main.py can read while agent workers write
+• One writer thread per process; submit() only enqueues, so the agent's
+  event loop never waits on disk. Queued reports are written in batches
+  with a single executemany + commit.
+• query() / get() are what main.py's /reports endpoints use
+Env:
+    REPORT_DB=<path>   (default: reports.db next to this file)
+"""
+import os
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger("report-store")
+
+REPORT_DB = os.getenv("REPORT_DB") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports.db")
+BATCH_SIZE = 64
+BATCH_WAIT = 0.5  # seconds to wait for more reports before writing a batch
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    session_id  TEXT PRIMARY KEY,
+    created_at  REAL NOT NULL,
+    name        TEXT,
+    phone       TEXT,
+    severity    TEXT,
+    emergency   INTEGER NOT NULL DEFAULT 0,
+    language    TEXT,
+    report_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_phone ON reports(phone);
+CREATE INDEX IF NOT EXISTS reports_created ON reports(created_at);
+"""
+
+_INSERT = (
+    "INSERT OR REPLACE INTO reports "
+    "(session_id, created_at, name, phone, severity, emergency, language, report_json) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def connect(path: str = REPORT_DB) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _row(report: dict) -> tuple:
+    return (
+        report["session_id"],
+        report.get("ended_at") or time.time(),
+        report.get("name"),
+        report.get("phone"),
+        report.get("severity"),
+        int(bool(report.get("emergency"))),
+        report.get("language"),
+        json.dumps(report, ensure_ascii=False),
+    )
+
+
+class ReportStore:
+    def __init__(self, path: str = REPORT_DB) -> None:
+        self.path = path
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._writer, name="report-writer", daemon=True)
+        self._thread.start()
+
+    # ---------- write side (agent workers) ---------------------------
+    def submit(self, report: dict) -> None:
+        """Non-blocking: the writer thread picks it up."""
+        self._queue.put(_row(report))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything submitted so far is on disk (or timeout)."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _writer(self) -> None:
+        conn = connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + BATCH_WAIT
+            while len(batch) < BATCH_SIZE and not isinstance(batch[-1], threading.Event):
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            rows = [b for b in batch if isinstance(b, tuple)]
+            if rows:
+                try:
+                    with conn:
+                        conn.executemany(_INSERT, rows)
+                    logger.debug(f"Stored {len(rows)} report(s)")
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not store {len(rows)} report(s): {e}")
+            for b in batch:
+                if isinstance(b, threading.Event):
+                    b.set()
+
+
+# ── Read side (main.py) ──────────────────────────────────────────────
+def query(phone: str | None = None, severity: str | None = None, limit: int = 50,
+          path: str = REPORT_DB) -> list[dict]:
+    where, args = [], []
+    if phone:
+        where.append("phone = ?")
+        args.append(phone)
+    if severity:
+        where.append("severity = ?")
+        args.append(severity)
+    sql = "SELECT report_json FROM reports"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC LIMIT ?"
+    conn = connect(path)
+    try:
+        return [json.loads(r[0]) for r in conn.execute(sql, (*args, limit))]
+    finally:
+        conn.close()
+
+
+def get(session_id: str, path: str = REPORT_DB) -> dict | None:
+    conn = connect(path)
+    try:
+        row = conn.execute("SELECT report_json FROM reports WHERE session_id = ?", (session_id,)).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else None
+
+
+# ── Process singleton ────────────────────────────────────────────────
+_store: ReportStore | None = None
+
+
+def get_store() -> ReportStore:
+    global _store
+    if _store is None:
+        _store = ReportStore()
+    return _store
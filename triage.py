@@ -0,0 +1,315 @@
+"""
+triage.py – local emergency check on every final transcript
+  1. a phrase table of red flags in the six supported languages
+     ("chest pain", "no puedo respirar", "सांस नहीं"), looked up word n-gram
+     by word n-gram, maps the transcript to a small vector of concept counts
+  2. chest pain, breathing trouble and self-harm phrases are an emergency
+     outright; anything else is scored by a logistic model with one NumPy
+     dot product (fainting, injuries and sensory phrases only together with
+     another red flag or an intensity word)
+The model is fitted once per worker process on the [Severity: ...] labels in
+paste.txt. Concepts are language-independent, so English training data
+covers every language in the phrase table. A check takes tens of microseconds.
+"""
+import os
+import re
+import json
+import time
+import logging
+from collections import Counter
+
+import numpy as np
+
+import worker_status
+from intent import normalize
+
+logger = logging.getLogger("triage")
+
+CORPUS_PATH = os.getenv(
+    "CANNED_CORPUS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "paste.txt")
+)
+THRESHOLD = float(os.getenv("TRIAGE_THRESHOLD", "0.5"))
+
+# ── Phrase table: concept → language → phrases ───────────────────────
+PHRASES = {
+    "chest_pain": {
+        "en": ["chest pain", "chest pressure", "crushing chest", "pain in my chest",
+               "chest is tight", "tightness in my chest"],
+        "es": ["dolor en el pecho", "dolor de pecho", "presión en el pecho"],
+        "fr": ["douleur thoracique", "douleur à la poitrine", "mal à la poitrine"],
+        "de": ["brustschmerzen", "schmerzen in der brust", "druck auf der brust"],
+        "it": ["dolore al petto", "dolore toracico"],
+        "hi": ["सीने में दर्द", "छाती में दर्द"],
+    },
+    "breathing": {
+        "en": ["can't breathe", "cannot breathe", "can't catch my breath", "difficulty breathing",
+               "shortness of breath", "suffocating", "turning blue", "breathing rapidly"],
+        "es": ["no puedo respirar", "dificultad para respirar", "me ahogo", "falta de aire"],
+        "fr": ["je ne peux pas respirer", "je n'arrive pas à respirer", "difficulté à respirer",
+               "j'étouffe", "souffle court"],
+        "de": ["ich kann nicht atmen", "atemnot", "keine luft", "ersticke"],
+        "it": ["non riesco a respirare", "difficoltà a respirare", "mi manca il respiro", "soffoco"],
+        "hi": ["सांस नहीं", "सांस लेने में तकलीफ", "सांस फूल", "दम घुट"],
+    },
+    "self_harm": {
+        "en": ["end my life", "end my own life", "take my own life", "kill myself", "want to die",
+               "wanna die", "wish i was dead", "wish i were dead", "better off dead", "ending it all",
+               "end it all", "don t want to live", "dont want to live", "do not want to live",
+               "no reason to live", "want to hurt myself", "hurting myself on purpose",
+               "giving up on life", "suicide", "suicidal"],
+        "es": ["suicidarme", "quitarme la vida", "no quiero vivir", "quiero morir", "quiero morirme",
+               "acabar con todo", "quiero hacerme daño", "suicidio"],
+        "fr": ["me suicider", "mettre fin à mes jours", "veux plus vivre", "veux mourir",
+               "en finir avec la vie", "envie de me faire du mal", "suicide"],
+        "de": ["mich umbringen", "suizid", "will nicht mehr leben", "will sterben",
+               "mir etwas antun", "selbstmord"],
+        "it": ["uccidermi", "suicidio", "voglio più vivere", "voglio morire", "farla finita",
+               "voglio farmi del male", "togliermi la vita"],
+        "hi": ["आत्महत्या", "जीना नहीं", "मरना चाहता", "मरना चाहती", "खुद को नुकसान", "जान दे"],
+    },
+    "unconscious": {
+        "en": ["lost consciousness", "passed out", "pass out", "collapsed", "fainted", "stay awake"],
+        "es": ["perdí el conocimiento", "me desmayé", "desmayo", "inconsciente"],
+        "fr": ["perdu connaissance", "évanoui", "évanouie", "inconscient"],
+        "de": ["bewusstlos", "ohnmächtig", "zusammengebrochen"],
+        "it": ["perso conoscenza", "svenuto", "svenuta", "incosciente"],
+        "hi": ["बेहोश", "होश खो"],
+    },
+    "seizure": {
+        "en": ["seizure", "seizures", "convulsion", "convulsions"],
+        "es": ["convulsión", "convulsiones"],
+        "fr": ["convulsions", "crise d'épilepsie"],
+        "de": ["krampfanfall", "krampfanfälle"],
+        "it": ["convulsioni", "crisi epilettica"],
+        "hi": ["दौरा", "दौरे", "मिर्गी"],
+    },
+    "stroke": {
+        "en": ["one side of my body", "speak properly", "slurred speech", "face drooping", "stroke"],
+        "es": ["un lado del cuerpo", "no puedo hablar", "derrame"],
+        "fr": ["un côté du corps", "parler correctement", "avc"],
+        "de": ["eine körperseite", "nicht richtig sprechen", "schlaganfall"],
+        "it": ["un lato del corpo", "parlare bene", "ictus"],
+        "hi": ["एक तरफ", "बोल नहीं पा", "लकवा"],
+    },
+    "bleeding": {
+        "en": ["vomiting blood", "coughing up blood", "blood in my stool", "blood in my urine",
+               "bleeding heavily", "won't stop bleeding", "tarry stools"],
+        "es": ["vomitando sangre", "tosiendo sangre", "sangrado abundante"],
+        "fr": ["vomis du sang", "crache du sang", "saigne beaucoup"],
+        "de": ["blut erbrechen", "blut husten", "starke blutung"],
+        "it": ["vomito sangue", "tossisco sangue", "sanguinamento"],
+        "hi": ["खून की उल्टी", "बहुत खून"],
+    },
+    "confusion": {
+        "en": ["confused", "confusion", "disoriented", "delirious", "think clearly"],
+        "es": ["confundido", "confundida", "desorientado", "desorientada"],
+        "fr": ["confus", "confuse", "désorienté", "désorientée"],
+        "de": ["verwirrt", "desorientiert"],
+        "it": ["confuso", "confusa", "disorientato", "disorientata"],
+        "hi": ["भ्रमित", "कुछ समझ नहीं"],
+    },
+    "high_fever": {
+        "en": ["high fever", "neck stiffness", "stiff neck"],
+        "es": ["fiebre alta", "cuello rígido"],
+        "fr": ["forte fièvre", "nuque raide"],
+        "de": ["hohes fieber", "steifer nacken"],
+        "it": ["febbre alta", "collo rigido"],
+        "hi": ["तेज बुखार", "गर्दन में अकड़न"],
+    },
+    "injury": {
+        "en": ["after a fall", "after an injury", "move my legs", "broken bone"],
+        "es": ["después de una caída", "hueso roto"],
+        "fr": ["après une chute", "os cassé"],
+        "de": ["nach einem sturz", "knochenbruch"],
+        "it": ["dopo una caduta", "osso rotto"],
+        "hi": ["गिर गया", "गिर गई", "हड्डी टूट"],
+    },
+    "senses": {
+        "en": ["lost vision", "lost my vision", "went blind", "lost my hearing", "heart is racing"],
+        "es": ["perdí la vista", "perdí el oído", "corazón acelerado"],
+        "fr": ["perdu la vue", "perdu l'audition", "cœur qui s'emballe"],
+        "de": ["sehkraft verloren", "gehör verloren", "herzrasen"],
+        "it": ["perso la vista", "perso l'udito", "cuore che batte forte"],
+        "hi": ["आंखों की रोशनी चली", "दिल तेज"],
+    },
+    "allergic": {
+        "en": ["throat swelling", "swollen throat", "blistering", "rapidly spreading", "deformed"],
+        "es": ["garganta hinchada", "ampollas", "se extiende rápido", "deformado"],
+        "fr": ["gorge gonflée", "cloques", "s'étend vite", "déformé"],
+        "de": ["geschwollener hals", "blasen", "breitet sich schnell aus", "verformt"],
+        "it": ["gola gonfia", "vesciche", "si diffonde rapidamente", "deformato"],
+        "hi": ["गले में सूजन", "छाले", "तेजी से फैल"],
+    },
+    "intensity": {
+        "en": ["severe", "severely", "extremely", "intense", "excruciating", "suddenly", "sudden",
+               "profusely", "won't go away", "won't stop"],
+        "es": ["fuerte", "intenso", "severo", "de repente", "muy grave"],
+        "fr": ["intense", "violent", "violente", "soudain", "sévère"],
+        "de": ["starke", "starken", "heftig", "plötzlich"],
+        "it": ["forte", "intenso", "improvviso", "grave"],
+        "hi": ["बहुत तेज", "अचानक", "बहुत ज्यादा"],
+    },
+    "mild": {
+        "en": ["mild", "slight", "a little", "sometimes", "occasional", "a bit"],
+        "es": ["leve", "un poco", "a veces"],
+        "fr": ["léger", "légère", "un peu", "parfois"],
+        "de": ["leicht", "leichte", "ein bisschen", "manchmal"],
+        "it": ["lieve", "un po", "a volte"],
+        "hi": ["थोड़ा", "हल्का", "कभी कभी"],
+    },
+}
+CONCEPTS = list(PHRASES)
+# Concepts that are an emergency on their own, whatever the model says
+DIRECT = ("chest_pain", "breathing", "self_harm")
+# Common in everyday talk ("I passed out from tiredness", "my heart is racing
+# after coffee"): scored only with another red flag or an intensity word
+WEAK = ("unconscious", "injury", "senses")
+# Qualify a red flag; never one by themselves
+MODIFIERS = ("intensity", "mild")
+_DIRECT_IDX = [CONCEPTS.index(c) for c in DIRECT]
+_WEAK_IDX = [CONCEPTS.index(c) for c in WEAK] + [CONCEPTS.index("intensity")]
+_STRONG_IDX = [i for i, c in enumerate(CONCEPTS) if c not in WEAK + MODIFIERS]
+_FLAG_IDX = [i for i, c in enumerate(CONCEPTS) if c not in MODIFIERS]
+
+# Played at once on a detected emergency, before the LLM's detailed reply
+EMERGENCY_MESSAGES = {
+    "en": "This sounds like an emergency. Please call 112 or go to the nearest hospital right now.",
+    "es": "Esto parece una emergencia. Llame al 112 o vaya al hospital más cercano ahora mismo.",
+    "fr": "Cela ressemble à une urgence. Appelez le 112 ou allez à l'hôpital le plus proche maintenant.",
+    "de": "Das klingt nach einem Notfall. Rufen Sie sofort 112 an oder gehen Sie ins nächste Krankenhaus.",
+    "it": "Sembra un'emergenza. Chiami subito il 112 o vada all'ospedale più vicino.",
+    "hi": "यह आपातकाल लगता है। कृपया अभी 112 पर कॉल करें या नज़दीकी अस्पताल जाएं।",
+}
+
+_SEVERITY_RE = re.compile(r"\[Severity:\s*(\w+)\]")
+_USER_RE = re.compile(r"User:\s*(.*?)\s*(?:\nAssistant:|$)", re.S)
+
+# Process-wide counters: checks, emergencies
+COUNTERS: Counter = Counter()
+
+
+def _build_index() -> tuple[dict, int]:
+    """normalized phrase -> (concept index, language); plus the longest phrase in words."""
+    lookup = {}
+    for concept, by_lang in PHRASES.items():
+        for lang, phrases in by_lang.items():
+            for phrase in phrases:
+                lookup.setdefault(normalize(phrase), (CONCEPTS.index(concept), lang))
+    return lookup, max(len(k.split()) for k in lookup)
+
+
+_LOOKUP, _MAX_WORDS = _build_index()
+
+
+def features(text: str) -> tuple[np.ndarray, str | None]:
+    """Concept counts for `text`, plus the language of the first phrase hit.
+    Longest phrase first at each word, so "chest pain" is not also "pain"."""
+    x = np.zeros(len(CONCEPTS) + 1)
+    x[-1] = 1.0  # bias
+    lang = None
+    words = normalize(text).split()
+    i = 0
+    while i < len(words):
+        for n in range(min(_MAX_WORDS, len(words) - i), 0, -1):
+            hit = _LOOKUP.get(" ".join(words[i:i + n]))
+            if hit:
+                x[hit[0]] += 1.0
+                lang = lang or hit[1]
+                i += n
+                break
+        else:
+            i += 1
+    return x, lang
+
+
+class TriageModel:
+    def __init__(self, weights: np.ndarray, threshold: float = THRESHOLD) -> None:
+        self.weights = weights
+        self.threshold = threshold
+
+    @classmethod
+    def fit(cls, texts: list[str], labels: list[int], epochs: int = 2000, lr: float = 0.5,
+            l2: float = 1e-3) -> "TriageModel":
+        """Batch gradient descent on the class-balanced logistic loss
+        (a missed emergency costs more than an extra warning)."""
+        X = np.stack([features(t)[0] for t in texts])
+        y = np.asarray(labels, dtype=float)
+        balance = np.where(y == 1, len(y) / (2 * y.sum()), len(y) / (2 * (len(y) - y.sum())))
+        w = np.zeros(X.shape[1])
+        for _ in range(epochs):
+            p = 1.0 / (1.0 + np.exp(-X @ w))
+            w -= lr * (X.T @ (balance * (p - y)) / len(y) + l2 * w)
+        return cls(w)
+
+    @classmethod
+    def from_jsonl(cls, path: str = CORPUS_PATH) -> "TriageModel":
+        texts, labels = [], []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                prompt = json.loads(line)["prompt"]
+                severity, user = _SEVERITY_RE.search(prompt), _USER_RE.search(prompt)
+                if severity and user:
+                    texts.append(user.group(1))
+                    labels.append(int(severity.group(1).lower() == "emergency"))
+        return cls.fit(texts, labels)
+
+    def score(self, text: str) -> tuple[float, str | None]:
+        x, lang = features(text)
+        if not x[_FLAG_IDX].any():
+            return 0.0, None  # no red-flag phrase at all
+        if x[_DIRECT_IDX].any():
+            return 1.0, lang
+        if not x[_STRONG_IDX].any() and x[_WEAK_IDX].sum() < 2:
+            return 0.0, lang  # one everyday-sounding phrase on its own
+        return float(1.0 / (1.0 + np.exp(-x @ self.weights))), lang
+
+
+# ── Regressions ───────────────────────────────────────────────────────
+# Checked after every fit; a miss is logged, not raised, so a call never fails on it
+MUST_FIRE = [
+    "I have chest pain", "I want to die", "I feel like ending it all",
+    "I don't want to live anymore", "I am planning to end my life", "I can't breathe",
+    "I suddenly passed out", "I am vomiting blood", "quiero morir",
+]
+MUST_NOT_FIRE = [
+    "I want to live a healthier life", "I had a blood test yesterday", "My blood sugar is high",
+    "I had a minor accident and scraped my knee", "Sorry, I can't hear you",
+    "I can't see my doctor until Monday", "My heart is racing after coffee",
+    "Non sento niente, puoi ripetere?", "Non vedo l'ora", "I passed out from tiredness after work",
+    "I am extremely tired", "I hurt myself playing football", "I need a new inhaler",
+]
+
+
+def regressions(model: TriageModel) -> list[str]:
+    """Phrases from MUST_FIRE / MUST_NOT_FIRE the model gets wrong."""
+    wrong = [t for t in MUST_FIRE if model.score(t)[0] < model.threshold]
+    return wrong + [t for t in MUST_NOT_FIRE if model.score(t)[0] >= model.threshold]
+
+
+# ── Process-wide model ────────────────────────────────────────────────
+_model: TriageModel | None = None
+
+
+def get_model() -> TriageModel:
+    global _model
+    if _model is None:
+        t0 = time.perf_counter()
+        _model = TriageModel.from_jsonl()
+        logger.info(f"Triage model: {len(_LOOKUP)} phrases fitted in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        for text in regressions(_model):
+            logger.warning(f"Triage regression: {text!r} is misclassified")
+    return _model
+
+
+def check(text: str) -> tuple[bool, float, str | None]:
+    """(is_emergency, score, language of the matched phrases) for one transcript."""
+    COUNTERS["checks"] += 1
+    model = get_model()
+    score, lang = model.score(text)
+    emergency = score >= model.threshold
+    if emergency:
+        COUNTERS["emergencies"] += 1
+    worker_status.publish("triage", dict(COUNTERS), min_interval=2.0)
+    return emergency, score, lang
@@ -0,0 +1,166 @@
+"""
+tts_cache.py – on-disk cache of synthesized audio for fixed phrases
+• Content-addressed: sha256 of (provider, model, voice, text)
+• Raw PCM files read back through mmap and pushed to the room as frames
+• Size-bounded LRU eviction (mtime is bumped on every hit)
+Pre-populate at deploy time (needs the provider API keys):
+    python tts_cache.py warm voice_agent
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+import asyncio
+import hashlib
+import logging
+import importlib
+from typing import AsyncIterator
+
+from livekit import rtc
+
+logger = logging.getLogger("tts-cache")
+
+CACHE_DIR = os.getenv(
+    "TTS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "lokswasthya", "tts")
+)
+MAX_BYTES = int(float(os.getenv("TTS_CACHE_MAX_MB", "256")) * 1024 * 1024)
+FRAME_MS = 20
+
+_HEADER = struct.Struct("<4sII")  # magic, sample_rate, num_channels
+_MAGIC = b"LKSC"
+
+
+def cache_key(tts_key: tuple, text: str) -> str:
+    return hashlib.sha256(json.dumps([*tts_key, text]).encode("utf-8")).hexdigest()
+
+
+def _path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.pcm")
+
+
+# ── Read side ─────────────────────────────────────────────────────────
+def lookup(tts_key: tuple, text: str) -> str | None:
+    path = _path(cache_key(tts_key, text))
+    if not os.path.exists(path):
+        return None
+    try:
+        os.utime(path)  # LRU touch
+    except OSError:
+        pass
+    return path
+
+
+async def _read_frames(path: str) -> AsyncIterator[rtc.AudioFrame]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, sample_rate, channels = _HEADER.unpack_from(mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"not a TTS cache file: {path}")
+        samples = sample_rate * FRAME_MS // 1000
+        step = samples * channels * 2
+        for off in range(_HEADER.size, len(mm), step):
+            chunk = mm[off:off + step]
+            yield rtc.AudioFrame(
+                data=chunk,
+                sample_rate=sample_rate,
+                num_channels=channels,
+                samples_per_channel=len(chunk) // (2 * channels),
+            )
+
+
+# ── Write side ────────────────────────────────────────────────────────
+def store(tts_key: tuple, text: str, frames: list[rtc.AudioFrame]) -> None:
+    if not frames:
+        return
+    path = _path(cache_key(tts_key, text))
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, frames[0].sample_rate, frames[0].num_channels))
+            for frame in frames:
+                f.write(bytes(frame.data))
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Could not cache TTS audio: {e}")
+        return
+    _evict()
+
+
+def _evict() -> None:
+    """Drop least recently used files until the cache fits in MAX_BYTES."""
+    entries = []
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith(".pcm"):
+                p = os.path.join(root, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries):
+        if total <= MAX_BYTES:
+            break
+        try:
+            os.remove(p)
+            total -= size
+        except OSError:
+            pass
+
+
+async def _synthesize_and_store(tts, tts_key: tuple, text: str) -> AsyncIterator[rtc.AudioFrame]:
+    """Stream frames from the provider while keeping a copy for the cache."""
+    frames = []
+    async with tts.synthesize(text) as stream:
+        async for ev in stream:
+            frames.append(ev.frame)
+            yield ev.frame
+    store(tts_key, text, frames)
+
+
+def audio_for(tts, tts_key: tuple, text: str) -> AsyncIterator[rtc.AudioFrame]:
+    path = lookup(tts_key, text)
+    if path is not None:
+        return _read_frames(path)
+    return _synthesize_and_store(tts, tts_key, text)
+
+
+def speak(session, tts, tts_key: tuple, text: str):
+    """Queue a fixed phrase and return its SpeechHandle without waiting for playout."""
+    if not tts_key:
+        return session.say(text)
+    return session.say(text, audio=audio_for(tts, tts_key, text))
+
+
+async def say(session, tts, tts_key: tuple, text: str):
+    """`session.say` for fixed phrases, served from disk when we've heard them before."""
+    return await speak(session, tts, tts_key, text)
+
+
+# ── Deploy-time warmup ────────────────────────────────────────────────
+async def warm(agent_module: str) -> None:
+    from livekit.agents.utils import http_context
+    from language_agent import FIXED_PHRASES
+
+    module = importlib.import_module(agent_module)
+    providers = module.build_providers()
+    # plugins expect the per-job HTTP session LiveKit normally sets up
+    http_context._new_session_ctx()
+    try:
+        for text in FIXED_PHRASES:
+            if lookup(providers.tts_key, text):
+                continue
+            async for _ in _synthesize_and_store(providers.tts, providers.tts_key, text):
+                pass
+            logger.info(f"Cached: {text}")
+    finally:
+        await http_context._close_http_ctx()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 3 or sys.argv[1] != "warm":
+        sys.exit("usage: python tts_cache.py warm <agent module, e.g. voice_agent>")
+    asyncio.run(warm(sys.argv[2]))
@@ -1,88 +1,107 @@
 import os
+import time
 import logging
+
+_IMPORT_T0 = time.perf_counter()  # reported to main.py as the worker's import time
 from dotenv import load_dotenv
-from livekit.agents import JobContext, WorkerOptions, cli
-from livekit.agents.voice import Agent, AgentSession
-from livekit.plugins import deepgram, groq, silero
+from livekit.agents import JobContext, JobProcess, WorkerOptions, cli
+from livekit.agents.voice import AgentSession
+from livekit.plugins import deepgram
+
+import admission
+import worker_status
+from language_agent import LanguageSwitcherBase
+from llm_router import RouterLLM, build_llm
+from prewarm import Providers, idle_processes, prewarm_process, take_providers
 
 # ── Setup ─────────────────────────────────────────────────────────────
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("stt-intent")
 load_dotenv()  # loads .env from current dir
 
-# ── Language tables ──────────────────────────────────────────────────
+# ── Instructions ──────────────────────────────────────────────────────
+INSTRUCTIONS = (
+    "You are a friendly voice health assistant named *LokSwasthya*, created by Rayyan Shaikh. "
+    "You help users with basic physical and mental health concerns in a conversational and caring tone. "
+    "You always respond in **simple English**, but you can understand questions in **multiple languages**. "
+    "Start by politely collecting the user's **name and phone number**. "
+    "Then ask about their symptoms, classify them as *mild*, *serious*, or *emergency*, and provide both **ayurvedic/natural** and **modern medical** suggestions where appropriate. "
+    "Show empathy, especially for mental health topics like depression, anxiety, or stress. "
+    "If symptoms are severe or urgent, gently advise the user to seek medical attention. "
+    "The health report is prepared automatically from the conversation; when the user is done, just close the call briefly and kindly. "
+    "Use only English when replying, avoid emojis or special characters. Keep responses short, warm, and easy to follow."
+    "Avoid long responses. Keep each reply suitable for spoken interaction — clear, concise, and polite. not a big paragraph "
+)
+
+# ── Providers ─────────────────────────────────────────────────────────
+TTS_MODEL = "aura-arcas-en"
+
+def build_providers() -> Providers:
+    """Provider clients for one session (built ahead of the call by prewarm)."""
+    return Providers(
+        stt=deepgram.STT(model="nova-3-general", language="multi"),
+        tts=deepgram.TTS(
+            model=TTS_MODEL,
+        ),
+        tts_key=("deepgram", TTS_MODEL, ""),
+        # Groq / Ollama chosen by LLM_PRIMARY / LLM_SECONDARY (see llm_router.py)
+        llm=RouterLLM.from_env(default_primary="groq"),
+        # tiny helper for intent detection (function‑calling not required)
+        intent_llm=build_llm(os.getenv("LLM_PRIMARY", "groq"), intent=True),
+    )
+
 
 # ── Agent class ───────────────────────────────────────────────────────
-class LanguageSwitcherAgent(Agent):
+class LanguageSwitcherAgent(LanguageSwitcherBase):
     """
     Replies in English via Ollama, but flips STT language when a helper
     GPT‑4o‑mini detects an intent like 'switch to Spanish'.
     """
-    def __init__(self) -> None:
+    def __init__(self, providers: Providers, session_id: str | None = None) -> None:
         super().__init__(
-            instructions=(
-                "You are a friendly voice health assistant named *LokSwasthya*, created by Rayyan Shaikh. "
-"You help users with basic physical and mental health concerns in a conversational and caring tone. "
-"You always respond in **simple English**, but you can understand questions in **multiple languages**. "
-"Start by politely collecting the user's **name and phone number**. "
-"Then ask about their symptoms, classify them as *mild*, *serious*, or *emergency*, and provide both **ayurvedic/natural** and **modern medical** suggestions where appropriate. "
-"Show empathy, especially for mental health topics like depression, anxiety, or stress. "
-"If symptoms are severe or urgent, gently advise the user to seek medical attention. "
-"At the end, generate a structured **health report in JSON** including the user's name, phone, symptoms, severity, and suggestions. "
-"Use only English when replying, avoid emojis or special characters. Keep responses short, warm, and easy to follow."
-"Avoid long responses. Keep each reply suitable for spoken interaction — clear, concise, and polite. not a big paragraph "
-
-            ),
-            stt=deepgram.STT(model="nova-3-general", language="multi"),
-            tts=deepgram.TTS(
-                model="aura-arcas-en",
-            ),
-            llm=groq.LLM(
-                model=os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile"),
-                api_key=os.getenv("GROQ_API_KEY"),
-            ),
-            vad=silero.VAD.load(),
+            providers,
+            instructions=INSTRUCTIONS,
+            session_id=session_id,
         )
 
-        # tiny helper for intent detection (function‑calling not required)
-        self.intent_llm = groq.LLM(
-            model=os.getenv("GROQ_INTENT_MODEL", "llama-3.2-11b-text-preview"),
-            api_key=os.getenv("GROQ_API_KEY"),
-        )
-
-        self.current_lang = "en"
-
-    # Initial greeting
-    async def on_enter(self):
-        await self.session.say(
-    "Hi! I'm LokSwasthya. Please tell me your name and phone number to begin your health check."
-)
 
+# ── Worker entrypoint ─────────────────────────────────────────────────
+def prewarm(proc: JobProcess):
+    prewarm_process(proc, build_providers, INSTRUCTIONS)
 
-    # Every final transcript arrives here
-    async def on_transcription_complete(self, text: str):
-        """Decide if the user asked to switch STT language."""
-        target_code = await self._detect_language_intent(text)
 
-        if target_code and target_code != self.current_lang:
-            await self._apply_stt_language(target_code)
-            return  # do NOT forward the phrase to Llama
+async def entrypoint(ctx: JobContext):
+    await ctx.connect()
+    logger.info("Worker connected")
 
-        # Otherwise: normal pipeline → Llama3 → ElevenLabs TTS
-        await self.session.generate_reply(text)
+    t0 = time.perf_counter()
+    providers, prewarmed = take_providers(ctx.proc, build_providers)
 
-    # ---------- helper methods ---------------------------------------
+    worker_status.session_started(ctx.job.id)
 
+    async def _session_ended():
+        worker_status.session_ended(ctx.job.id)
 
-# ── Worker entrypoint ─────────────────────────────────────────────────
-async def entrypoint(ctx: JobContext):
-    await ctx.connect()
-    logger.info("Worker connected")
+    ctx.add_shutdown_callback(_session_ended)
 
     session = AgentSession()
-    await session.start(agent=LanguageSwitcherAgent(), room=ctx.room)
-    logger.info("Agent session started")
+    await session.start(agent=LanguageSwitcherAgent(providers, ctx.job.id), room=ctx.room)
+    logger.info(
+        "Agent session started (construction %.1f ms, prewarmed=%s)",
+        (time.perf_counter() - t0) * 1000, prewarmed,
+    )
 
 # ── Main ──────────────────────────────────────────────────────────────
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
+    worker_status.mark_ready("imported", seconds=round(time.perf_counter() - _IMPORT_T0, 3))
+    worker_status.watch_registration()
+    cli.run_app(WorkerOptions(
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
+        # prewarmed processes: AGENT_IDLE_PROCESSES, else one in dev, LiveKit's default in start
+        **idle_processes(),
+        # stop taking jobs before the calls already here slow down
+        load_fnc=admission.load_fnc,
+        load_threshold=admission.THRESHOLD,
+        port=int(os.getenv("AGENT_HTTP_PORT", "8081")),
+    ))
@@ -0,0 +1,286 @@
+"""
+worker_status.py – tiny file-based status channel between agent workers and main.py
+• Each supervised worker gets a directory  <STATUS_DIR>/<worker id>/
+• Job processes drop one marker file per live session into  sessions/
+• main.py counts those markers for the /workers status endpoints
+• Job processes publish small JSON counter snapshots that main.py sums up;
+  LiveKit starts a process per call, so main.py periodically folds the
+  snapshots of exited processes into one <name>-done.json per worker
+Files (not sockets) because LiveKit runs every job in its own process.
+"""
+import os
+import re
+import json
+import time
+import glob
+import shutil
+import logging
+import tempfile
+import threading
+from typing import Callable
+
+logger = logging.getLogger("worker-status")
+
+STATUS_DIR = os.getenv(
+    "LOKSWASTHYA_STATUS_DIR", os.path.join(tempfile.gettempdir(), "lokswasthya")
+)
+WORKER_ID = os.getenv("LOKSWASTHYA_WORKER_ID", "0")
+
+
+def worker_dir(worker_id: str = WORKER_ID) -> str:
+    return os.path.join(STATUS_DIR, str(worker_id))
+
+
+def _sessions_dir(worker_id: str) -> str:
+    return os.path.join(worker_dir(worker_id), "sessions")
+
+
+# ── Agent side ────────────────────────────────────────────────────────
+def session_started(session_id: str) -> None:
+    path = _sessions_dir(WORKER_ID)
+    try:
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, session_id), "w") as f:
+            f.write(str(os.getpid()))
+    except OSError as e:
+        logger.warning(f"Could not record session start: {e}")
+
+
+def session_ended(session_id: str) -> None:
+    try:
+        os.remove(os.path.join(_sessions_dir(WORKER_ID), session_id))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not record session end: {e}")
+
+
+def mark_ready(stage: str, **info) -> None:
+    """Record a startup milestone of this worker (see READY_STAGES)."""
+    publish(f"ready_{stage}", {"at": time.time(), **info})
+
+
+def clear_ready(stage: str) -> None:
+    """Take back a milestone this process no longer meets."""
+    try:
+        os.remove(os.path.join(worker_dir(WORKER_ID), f"ready_{stage}-{os.getpid()}.json"))
+    except OSError:
+        pass
+
+
+# LiveKit's warnings when the worker's server connection drops
+_UNREGISTERED_RE = re.compile(r"failed to connect|connection (?:closed|lost)|disconnected", re.I)
+
+
+class _RegistrationWatch(logging.Handler):
+    """LiveKit only logs when the worker registers with the server (or loses
+    the connection); turn those lines into the readiness marker."""
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if message.startswith("registered worker"):
+            mark_ready("registered")
+        elif record.levelno >= logging.WARNING and _UNREGISTERED_RE.search(message):
+            clear_ready("registered")
+
+
+def watch_registration(logger_name: str = "livekit.agents") -> None:
+    logging.getLogger(logger_name).addHandler(_RegistrationWatch(level=logging.INFO))
+
+
+_last_publish: dict[str, float] = {}
+
+
+def publish(name: str, payload: dict, min_interval: float = 0.0) -> None:
+    """Snapshot this process's counters as <worker dir>/<name>-<pid>.json."""
+    now = time.monotonic()
+    if now - _last_publish.get(name, -min_interval) < min_interval:
+        return
+    _last_publish[name] = now
+    path = os.path.join(worker_dir(WORKER_ID), f"{name}-{os.getpid()}.json")
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)  # readers never see half a file
+    except OSError as e:
+        logger.warning(f"Could not publish {name}: {e}")
+
+
+# ── Supervisor side ───────────────────────────────────────────────────
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def active_sessions(worker_id: str) -> int:
+    """Session markers whose job process is still running; a crashed process
+    never removes its marker, so those are dropped here."""
+    path = _sessions_dir(worker_id)
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return 0
+    count = 0
+    for name in names:
+        marker = os.path.join(path, name)
+        try:
+            with open(marker) as f:
+                pid = f.read().strip()
+        except OSError:
+            continue
+        if not pid.isdigit() or _pid_alive(int(pid)):  # empty: still being written
+            count += 1
+            continue
+        try:
+            os.remove(marker)
+        except OSError:
+            pass
+    return count
+
+
+READY_STAGES = ("registered", "prewarmed")
+
+
+def _session_pids(worker_id: str) -> set[int]:
+    pids = set()
+    for marker in glob.glob(os.path.join(_sessions_dir(worker_id), "*")):
+        try:
+            with open(marker) as f:
+                pid = f.read().strip()
+        except OSError:
+            continue
+        if pid.isdigit():
+            pids.add(int(pid))
+    return pids
+
+
+def readiness(worker_id: str) -> dict:
+    """Milestones a worker currently meets, with their timings. Only running
+    processes count, and a prewarmed process serving a call is no longer
+    idle, so losing the registration or the idle process shows here."""
+    busy = _session_pids(worker_id)
+    stages = {}
+    for stage in ("imported", *READY_STAGES):
+        snapshots = []
+        for path in glob.glob(os.path.join(worker_dir(worker_id), f"ready_{stage}-*.json")):
+            pid = os.path.basename(path)[:-len(".json")].rpartition("-")[2]
+            if not pid.isdigit() or not _pid_alive(int(pid)):
+                continue
+            if stage == "prewarmed" and int(pid) in busy:
+                continue
+            snap = _read(path)
+            if snap is not None:
+                snapshots.append(snap)
+        if snapshots:
+            stages[stage] = max(snapshots, key=lambda s: s["at"])
+    return {"ready": all(s in stages for s in READY_STAGES), "stages": stages}
+
+
+def reset_worker(worker_id: str) -> None:
+    """Forget everything a (crashed) worker left behind before restarting it."""
+    shutil.rmtree(worker_dir(worker_id), ignore_errors=True)
+    os.makedirs(worker_dir(worker_id), exist_ok=True)
+
+
+def sum_counters(total: dict, snap: dict) -> dict:
+    for key, value in snap.items():
+        if isinstance(value, (int, float)):
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+# How to fold an exited process's snapshot into <name>-done.json. Snapshots
+# without a fold (loop lag, load) are point-in-time: only the newest one of
+# exited processes is kept; readiness markers of exited processes are
+# dropped. metrics.py registers "metrics".
+FOLDS: dict[str, Callable[[dict, dict], dict]] = {
+    name: sum_counters for name in (
+        "intent", "canned", "triage", "audio_gate", "admission",
+        "llm_router", "groq_scheduler", "ollama",
+    )
+}
+
+_compact_lock = threading.Lock()
+
+
+def _read(path: str) -> dict | None:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove(path: str) -> int:
+    try:
+        os.remove(path)
+        return 1
+    except OSError:
+        return 0
+
+
+def _fold_into_done(path: str, name: str, fold: Callable[[dict, dict], dict]) -> bool:
+    snap = _read(path)
+    if snap is None:
+        return True  # unreadable leftovers are dropped too
+    done = os.path.join(os.path.dirname(path), f"{name}-done.json")
+    tmp = f"{done}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(fold(_read(done) or {}, snap), f)
+        os.replace(tmp, done)
+    except OSError as e:
+        logger.warning(f"Could not fold {path}: {e}")
+        return False
+    return True
+
+
+def compact(worker_id: str | None = None) -> int:
+    """Fold or drop the snapshots of processes that have exited; returns how
+    many files were removed. Keeps the status dir from growing with every call."""
+    removed = 0
+    stale: dict[tuple, list[str]] = {}  # point-in-time snapshots of exited processes
+    with _compact_lock:
+        for path in glob.glob(os.path.join(STATUS_DIR, worker_id or "*", "*-*.json")):
+            name, _, pid = os.path.basename(path)[:-len(".json")].rpartition("-")
+            if not pid.isdigit() or _pid_alive(int(pid)):
+                continue
+            fold = FOLDS.get(name)
+            if name.startswith("ready_"):
+                removed += _remove(path)  # a milestone of a process that is gone
+            elif fold is None:
+                stale.setdefault((os.path.dirname(path), name), []).append(path)
+            elif _fold_into_done(path, name, fold):
+                removed += _remove(path)
+        for paths in stale.values():
+            paths.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0.0)
+            for path in paths[:-1]:
+                removed += _remove(path)
+    return removed
+
+
+def collect(name: str, worker_id: str | None = None) -> list[dict]:
+    """Every snapshot published under `name` (all workers unless one is given)."""
+    pattern = os.path.join(STATUS_DIR, worker_id or "*", f"{name}-*.json")
+    snapshots = []
+    for path in glob.glob(pattern):
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def collect_counters(name: str, worker_id: str | None = None) -> dict:
+    """Sum numeric counters across every published snapshot."""
+    totals: dict = {}
+    for snap in collect(name, worker_id):
+        sum_counters(totals, snap)
+    return totals